@@ -0,0 +1,300 @@
+"""Asyncio serving mode: video viewers, the control socket and the status stream all run as
+coroutines on one event loop, with blocking work moved to a fixed pool of executor threads.
+
+    SERVER_MODE=async python cam.py
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web, WSMsgType
+
+import metrics
+from motors import ControlChannel
+from recording import PlaybackClock
+from telemetry import select_payload
+from video import LadderViewer, multipart_header, socket_backlog
+
+
+class Mirror:
+    """Follows a thread-side "newest value" source from one executor thread and wakes asyncio waiters"""
+
+    def __init__(self, wait, executor):
+        self.wait = wait  # blocking wait(last_seq) -> (seq, value), returning on change or timeout
+        self.executor = executor
+        self.seq = None
+        self.value = None
+        self.changed = None
+
+    async def run(self):
+        self.changed = asyncio.Condition()
+        loop = asyncio.get_running_loop()
+        while True:
+            seq, value = await loop.run_in_executor(self.executor, self.wait, self.seq)
+            if seq == self.seq:
+                continue
+            async with self.changed:
+                self.seq, self.value = seq, value
+                self.changed.notify_all()
+
+    async def next(self, last_seq, timeout=None):
+        """Wait for a value newer than last_seq; returns (last_seq, None) on timeout"""
+        async with self.changed:
+            try:
+                await asyncio.wait_for(
+                    self.changed.wait_for(lambda: self.seq is not None and self.seq != last_seq), timeout)
+            except asyncio.TimeoutError:
+                return last_seq, None
+            return self.seq, self.value
+
+
+class MultipartWriter:
+    """Writes JPEG frames as the parts of a multipart/x-mixed-replace response"""
+
+    def __init__(self, response):
+        self.response = response
+        self.first = True
+
+    @classmethod
+    async def start(cls, request):
+        response = web.StreamResponse(headers={'Content-Type': 'multipart/x-mixed-replace; boundary=frame'})
+        await response.prepare(request)
+        return cls(response)
+
+    async def write(self, frame):
+        # write() waits for the transport to drain, so this returns once the frame is on its way
+        await self.response.write(multipart_header(len(frame), first=self.first))
+        await self.response.write(frame)
+        self.first = False
+
+
+def query_arg(request, name, default=None, type=float):
+    """A query parameter converted with type, or default if it's missing or malformed, like Flask's args.get()"""
+    try:
+        return type(request.query[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def transport_backlog(transport):
+    """socket_backlog() plus whatever the transport is still holding on its side of the socket"""
+    backlog = socket_backlog(transport.get_extra_info('socket')) if transport else None
+    if backlog is None:
+        return None
+    return lambda: (backlog() or 0) + transport.get_write_buffer_size()
+
+
+def create_app(assets, frame_hub, status_stream, get_status, control_command, drive, history, playback=None,
+               vision=None, adaptive=True, workers=4):
+    # Two threads park in the mirrors' blocking waits, the rest take variant encodes and history queries
+    mirror_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='mirror')
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-work')
+    frames = Mirror(lambda seq: frame_hub.wait(seq, timeout=1.0), mirror_executor)
+    status = Mirror(lambda seq: status_stream.wait_all(seq, timeout=1.0), mirror_executor)
+    # Overlays arrive at each processor's own rate, one parked thread per drawing processor follows them
+    overlay_hubs = vision.overlays() if vision else {}
+    overlay_executor = (ThreadPoolExecutor(max_workers=len(overlay_hubs), thread_name_prefix='overlay-mirror')
+                        if overlay_hubs else None)
+    overlays = {name: Mirror(lambda seq, hub=hub: hub.wait(seq, timeout=1.0), overlay_executor)
+                for name, hub in overlay_hubs.items()}
+    # Recording playback reads segment files here, so a disk stall doesn't hold up the async-work pool
+    playback_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='playback') if playback else None
+
+    def asset_response(result):
+        status, headers, body = result
+        return web.Response(body=body, status=status, headers=headers)
+
+    async def index(request):
+        return asset_response(assets.index(request.headers.get('Accept-Encoding', ''),
+                                           request.headers.get('If-None-Match', '')))
+
+    async def asset(request):
+        result = assets.get(request.match_info['digest'], request.match_info['name'],
+                            request.headers.get('Accept-Encoding', ''), request.headers.get('If-None-Match', ''))
+        if result is None:
+            raise web.HTTPNotFound()
+        return asset_response(result)
+
+    async def video_feed(request):
+        writer = await MultipartWriter.start(request)
+        loop = asyncio.get_running_loop()
+        viewer = LadderViewer(frame_hub, adaptive, transport_backlog(request.transport))
+        frame_hub.subscribe()
+        total = 0
+        try:
+            seq = frames.seq
+            while frame_hub.running:
+                seq, frame = await frames.next(seq, timeout=2.0)
+                if frame is None or not viewer.due():
+                    continue
+                if viewer.rung:
+                    _, frame = await loop.run_in_executor(executor, frame_hub.variant, viewer.rung)
+                    if frame is None:
+                        continue
+                sent = loop.time()
+                await writer.write(frame)
+                send_time = loop.time() - sent
+                frame_hub.send_time.observe(send_time)
+                frame_hub.sent_bytes.inc(len(frame))
+                total += len(frame)
+                viewer.sent(send_time, len(frame))
+        except ConnectionResetError:
+            pass
+        finally:
+            frame_hub.client_bytes.observe(total)
+            frame_hub.unsubscribe()
+        return writer.response
+
+    async def recording_segments(request):
+        if not playback:
+            raise web.HTTPNotFound()
+        loop = asyncio.get_running_loop()
+        return web.json_response(await loop.run_in_executor(executor, playback.segments))
+
+    async def recording_frame(request):
+        t = query_arg(request, 't', 0.0)
+        loop = asyncio.get_running_loop()
+        found = await loop.run_in_executor(executor, playback.frame_at, t) if playback else None
+        if found is None:
+            raise web.HTTPNotFound()
+        timestamp, frame = found
+        return web.Response(body=frame, content_type='image/jpeg', headers={'X-Frame-Time': f"{timestamp:.3f}"})
+
+    async def recording_stream(request):
+        if not playback:
+            raise web.HTTPNotFound()
+        reads = playback.read_frames(query_arg(request, 't', 0.0))
+        clock = PlaybackClock(query_arg(request, 'speed', 1.0))
+        writer = await MultipartWriter.start(request)
+        loop = asyncio.get_running_loop()
+        try:
+            # Only the reads take a thread; the wait between frames happens on the loop
+            while (found := await loop.run_in_executor(playback_executor, next, reads, None)) is not None:
+                frame_time, frame = found
+                await asyncio.sleep(max(0.0, clock.delay(frame_time)))
+                await writer.write(frame)
+        except ConnectionResetError:
+            pass
+        finally:
+            try:
+                reads.close()
+            except ValueError:
+                pass  # cancelled mid-read, the thread finishes it and the generator goes with the last reference
+        return writer.response
+
+    async def vision_status(request):
+        if not vision:
+            raise web.HTTPNotFound()
+        return web.json_response(vision.status())
+
+    async def vision_overlay(request):
+        name = request.query.get('processor', '')
+        mirror = overlays.get(name)
+        if mirror is None:
+            raise web.HTTPNotFound()
+        overlay = overlay_hubs[name]
+        writer = await MultipartWriter.start(request)
+        viewer = LadderViewer(overlay, adaptive=False, backlog=transport_backlog(request.transport))
+        # Counted as a viewer so the processor draws and encodes its overlay
+        overlay.subscribe()
+        total = 0
+        try:
+            seq = mirror.seq
+            while overlay.running:
+                seq, frame = await mirror.next(seq, timeout=2.0)
+                if frame is None or not viewer.due():
+                    continue
+                await writer.write(frame)
+                overlay.sent_bytes.inc(len(frame))
+                total += len(frame)
+                viewer.sent(0.0, len(frame))
+        except ConnectionResetError:
+            pass
+        finally:
+            overlay.client_bytes.observe(total)
+            overlay.unsubscribe()
+        return writer.response
+
+    async def status_handler(request):
+        return web.json_response(get_status())
+
+    async def status_feed(request):
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        seq = None
+        try:
+            while True:
+                new_seq, payloads = await status.next(seq, timeout=15)
+                if payloads is None:
+                    await response.write(b": keepalive\n\n")
+                    continue
+                payload = select_payload(seq, new_seq, *payloads)
+                seq = new_seq
+                if payload is not None:
+                    await response.write(payload)
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def status_history(request):
+        seconds = query_arg(request, 'seconds', 60)
+        points = max(1, query_arg(request, 'points', 200, type=int))
+        start = query_arg(request, 'start')
+        end = query_arg(request, 'end')
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            executor, lambda: history(seconds=seconds, points=points, start=start, end=end))
+        return web.json_response(result)
+
+    async def control(request):
+        # drive() only drops a setpoint into the control loop's mailbox, safe to call on the loop
+        try:
+            return web.json_response(control_command(await request.json()))
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+
+    async def control_ws(request):
+        """Persistent control channel carrying compact [seq, x, y, speed] messages"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        channel = ControlChannel(drive)
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    channel.handle(message.data)
+        finally:
+            channel.close()
+        return ws
+
+    async def metrics_handler(request):
+        return web.Response(text=metrics.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    async def start_mirrors(app):
+        app['mirrors'] = [asyncio.create_task(mirror.run()) for mirror in (frames, status, *overlays.values())]
+
+    async def stop_mirrors(app):
+        for task in app['mirrors']:
+            task.cancel()
+
+    app = web.Application()
+    app.router.add_get('/', index)
+    app.router.add_get('/assets/{digest}/{name}', asset)
+    app.router.add_get('/video_feed', video_feed)
+    app.router.add_get('/status', status_handler)
+    app.router.add_get('/status/stream', status_feed)
+    app.router.add_get('/status/history', status_history)
+    app.router.add_post('/control', control)
+    app.router.add_get('/control_ws', control_ws)
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/recording/segments', recording_segments)
+    app.router.add_get('/recording/frame', recording_frame)
+    app.router.add_get('/recording/stream', recording_stream)
+    app.router.add_get('/vision', vision_status)
+    app.router.add_get('/vision/overlay', vision_overlay)
+    app.on_startup.append(start_mirrors)
+    app.on_cleanup.append(stop_mirrors)
+    return app
+
+
+def serve(host='0.0.0.0', port=5000, **kwargs):
+    print(f"Serving async on http://{host}:{port}")
+    web.run_app(create_app(**kwargs), host=host, port=port, print=None, handle_signals=False)
@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+# brotli is optional, without it clients get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+class Asset:
+    """One file held in memory with its precompressed variants"""
+
+    def __init__(self, name, body, digest):
+        self.name = name
+        self.digest = digest
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type.endswith('javascript'):
+            self.content_type += '; charset=utf-8'
+        self.variants = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            # Tiny files can come out bigger compressed
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+
+class StaticAssets:
+    """The UI files, loaded and compressed once at startup.
+
+    app.css and app.js are served under a content-hash URL with Cache-Control: immutable, and
+    index.html is rewritten to point at those URLs. index.html itself lives at / so it can only be
+    revalidated, which costs a 304 when nothing changed.
+    """
+
+    def __init__(self, directory=STATIC_DIR, page='index.html'):
+        self.assets = {}
+        names = sorted(name for name in os.listdir(directory) if name != page)
+        for name in names:
+            with open(os.path.join(directory, name), 'rb') as f:
+                body = f.read()
+            self.assets[name] = Asset(name, body, hashlib.sha256(body).hexdigest()[:16])
+
+        with open(os.path.join(directory, page), 'rb') as f:
+            html = f.read()
+        # Point href="app.css" / src="app.js" at the hashed URLs
+        pattern = re.compile(rb'(href|src)="(%s)"' % b'|'.join(re.escape(name.encode()) for name in names))
+        html = pattern.sub(lambda m: b'%s="%s"' % (m.group(1), self.url(m.group(2).decode()).encode()), html)
+        self.page = Asset(page, html, hashlib.sha256(html).hexdigest()[:16])
+
+    def url(self, name):
+        return f"/assets/{self.assets[name].digest}/{name}"
+
+    def response(self, asset, accept_encoding='', if_none_match='', immutable=True):
+        """Return (status, headers, body) for an asset, picking the best encoding the client accepts"""
+        accepted = parse_accept_encoding(accept_encoding)
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+
+        # Strong ETags have to differ per encoding since the bytes differ
+        etag = f'"{asset.digest}-{encoding}"'
+        headers = {
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': 'public, max-age=31536000, immutable' if immutable else 'no-cache',
+        }
+        if etag_matches(if_none_match, etag):
+            return 304, headers, b''
+
+        headers['Content-Type'] = asset.content_type
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, asset.variants[encoding]
+
+    def index(self, accept_encoding='', if_none_match=''):
+        return self.response(self.page, accept_encoding, if_none_match, immutable=False)
+
+    def get(self, digest, name, accept_encoding='', if_none_match=''):
+        """Response for /assets/<digest>/<name>, or None if no such asset"""
+        asset = self.assets.get(name)
+        if asset is None or asset.digest != digest:
+            return None
+        return self.response(asset, accept_encoding, if_none_match)
+
+
+def parse_accept_encoding(header):
+    """Encodings the client accepts with a non-zero q value"""
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q=') and q[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison is what If-None-Match asks for
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag in tags
@@ -0,0 +1,267 @@
+"""End-to-end load benchmark of cam.py with a synthetic camera and the simulated ODrive.
+
+    python bench_server.py [--seconds 10] [--viewers 4] [--control-hz 50] [--status-hz 2]
+                           [--sim-latency-ms 2] [--mode threaded|async] [--output result.json]
+
+Starts cam.py on a spare port, runs video readers, a /control sender and a /status poller against
+it, and prints a JSON report to compare across commits.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def get_json(port, path, timeout=5):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return get_json(port, '/status', timeout=1)
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"server didn't answer /status within {timeout}s")
+
+
+class ProcessSampler:
+    """CPU time and peak RSS of the server process and its children, from /proc"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.peak_rss = 0
+
+    def pids(self):
+        pids = [self.pid]
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as f:
+                        # ppid is the 2nd field after the parenthesised command name
+                        if int(f.read().rsplit(')', 1)[1].split()[1]) == self.pid:
+                            pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    pass
+        return pids
+
+    def cpu_seconds(self):
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                total += int(fields[11]) + int(fields[12])  # utime + stime
+            except OSError:
+                pass
+        return total / self.ticks
+
+    def sample_rss(self):
+        rss = 0
+        for pid in self.pids():
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            rss += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+
+def read_video(port, stop, result):
+    """Read /video_feed and count the JPEG parts that arrive"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', '/video_feed')
+    response = conn.getresponse()
+    try:
+        while not stop.is_set():
+            line = response.readline()
+            if not line:
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':', 1)[1])
+                response.readline()
+                response.read(length)
+                result['frames'] += 1
+                result['bytes'] += length
+    except OSError as e:
+        result['error'] = str(e)
+    finally:
+        conn.close()
+
+
+def send_controls(port, rate_hz, stop, latencies, errors):
+    """POST /control at rate_hz over one keep-alive connection, timing each round-trip"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    period = 1.0 / rate_hz
+    next_send = time.monotonic()
+    while not stop.is_set():
+        body = json.dumps({'x': random.uniform(-1, 1), 'y': random.uniform(-1, 1), 'speed': 1.0})
+        started = time.perf_counter()
+        try:
+            conn.request('POST', '/control', body, {'Content-Type': 'application/json'})
+            conn.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        next_send += period
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_send = time.monotonic()
+    conn.close()
+
+
+def poll_status(port, rate_hz, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            get_json(port, '/status')
+            latencies.append(time.perf_counter() - started)
+        except OSError:
+            pass
+        stop.wait(1.0 / rate_hz)
+
+
+def motor_writes(status):
+    """Velocity writes that actually reached the (simulated) ODrive"""
+    bus = status.get('motor_bus', {})
+    return sum(counts['writes'] for path, counts in bus.items() if path.endswith('input_vel'))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), SERVER_MODE=args.mode, MOTOR_BACKEND='sim',
+               SIM_LATENCY=str(args.sim_latency_ms / 1000), CAMERA_SOURCE='synthetic',
+               CAMERA_WIDTH=str(args.width), CAMERA_HEIGHT=str(args.height), CAMERA_FPS=str(args.fps),
+               VIDEO_PROCESS='1' if args.video_process else '0', LOG_INTERVAL='60')
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'cam.py')], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        startup_started = time.monotonic()
+        wait_until_up(port)
+        startup = time.monotonic() - startup_started
+        time.sleep(args.warmup)
+
+        stop = threading.Event()
+        viewers = [{'frames': 0, 'bytes': 0} for _ in range(args.viewers)]
+        control_latencies, control_errors, status_latencies = [], [], []
+        threads = [threading.Thread(target=read_video, args=(port, stop, viewer), daemon=True)
+                   for viewer in viewers]
+        if args.control_hz > 0:
+            threads.append(threading.Thread(target=send_controls, daemon=True,
+                                            args=(port, args.control_hz, stop, control_latencies, control_errors)))
+        if args.status_hz > 0:
+            threads.append(threading.Thread(target=poll_status, daemon=True,
+                                            args=(port, args.status_hz, stop, status_latencies)))
+
+        sampler = ProcessSampler(server.pid)
+        writes_before = motor_writes(get_json(port, '/status'))
+        cpu_before = sampler.cpu_seconds()
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        while time.monotonic() - started < args.seconds:
+            sampler.sample_rss()
+            time.sleep(0.5)
+        elapsed = time.monotonic() - started
+        cpu = sampler.cpu_seconds() - cpu_before
+        writes = motor_writes(get_json(port, '/status')) - writes_before
+        stop.set()
+
+        ms = lambda value: round(value * 1000, 3) if value is not None else None
+        return {
+            'commit': git_commit(),
+            'config': vars(args),
+            'startup_s': round(startup, 3),
+            'duration_s': round(elapsed, 3),
+            'video': {
+                'fps_per_client': [round(viewer['frames'] / elapsed, 2) for viewer in viewers],
+                'kbytes_per_s_per_client': [round(viewer['bytes'] / elapsed / 1024, 1) for viewer in viewers],
+                'errors': [viewer['error'] for viewer in viewers if 'error' in viewer],
+            },
+            'control': {
+                'sent': len(control_latencies),
+                'errors': len(control_errors),
+                'rtt_p50_ms': ms(percentile(control_latencies, 0.5)),
+                'rtt_p99_ms': ms(percentile(control_latencies, 0.99)),
+            },
+            'status': {
+                'polls': len(status_latencies),
+                'rtt_p50_ms': ms(percentile(status_latencies, 0.5)),
+                'rtt_p99_ms': ms(percentile(status_latencies, 0.99)),
+            },
+            'odrive_writes_per_s': round(writes / elapsed, 1),
+            'cpu_percent': round(cpu / elapsed * 100, 1),
+            'peak_rss_mb': round(sampler.peak_rss / 2 ** 20, 1),
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(5)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10.0, help="measured duration")
+    parser.add_argument('--warmup', type=float, default=1.0, help="seconds between startup and load")
+    parser.add_argument('--viewers', type=int, default=4, help="concurrent /video_feed readers")
+    parser.add_argument('--control-hz', type=float, default=50.0, help="/control POST rate, 0 for none")
+    parser.add_argument('--status-hz', type=float, default=2.0, help="/status poll rate, 0 for none")
+    parser.add_argument('--sim-latency-ms', type=float, default=2.0, help="simulated ODrive time per command")
+    parser.add_argument('--mode', choices=('threaded', 'async'), default='threaded')
+    parser.add_argument('--video-process', action='store_true', help="capture and encode in a worker process")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--output', help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
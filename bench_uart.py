@@ -0,0 +1,149 @@
+"""Benchmark the UART transport against a fake ODrive on a pseudo-terminal.
+
+    python bench_uart.py [--seconds 3] [--baudrate 115200] [--latency-ms 0.2]
+"""
+import argparse
+import os
+import threading
+import time
+import tty
+
+import serial
+
+from uart import OdriveUart, BAUDRATE
+
+
+class FakeOdrive:
+    """Answers the ODrive ASCII protocol on the master side of a pty, with serial line timing"""
+
+    def __init__(self, baudrate=BAUDRATE, latency=0.0002):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self.byte_time = 10.0 / baudrate  # 8N1 is 10 bits on the wire per byte
+        self.latency = latency
+        self.props = {
+            'vbus_voltage': 15.8,
+            'axis0.motor.current_control.Iq_measured': 0.4,
+            'axis1.motor.current_control.Iq_measured': -0.3,
+            'axis0.requested_state': 1,
+            'axis1.requested_state': 1,
+        }
+        self.vel = [0.0, 0.0]
+        self.commands = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        buffer = b''
+        while True:
+            data = os.read(self.master, 4096)
+            # Receiving takes as long as the bytes need on the wire
+            time.sleep(len(data) * self.byte_time)
+            buffer += data
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                reply = self._handle(line.decode().strip())
+                if reply is not None:
+                    time.sleep(self.latency + (len(reply) + 2) * self.byte_time)
+                    os.write(self.master, (reply + '\r\n').encode())
+
+    def _handle(self, command):
+        self.commands += 1
+        parts = command.split()
+        if not parts:
+            return None
+        if parts[0] == 'r':
+            return str(self.props.get(parts[1], 'invalid property'))
+        if parts[0] == 'w':
+            self.props[parts[1]] = float(parts[2])
+            return None
+        if parts[0] == 'v':
+            self.vel[int(parts[1])] = float(parts[2])
+            return None
+        if parts[0] == 'f':
+            return f"0.0 {self.vel[int(parts[1])]}"
+        return 'unknown command'
+
+
+def legacy_command(ser, command, delay=0.1):
+    """The original send_ascii_command: write, sleep, then block on readline"""
+    ser.write((command + '\n').encode())
+    if delay: time.sleep(delay)
+    return ser.readline().decode().strip()
+
+
+def bench_legacy(fake, baudrate):
+    """Read vbus_voltage and switch both axes the way uart.py used to"""
+    ser = serial.Serial(fake.port, baudrate, timeout=0.2)
+    started = time.perf_counter()
+    legacy_command(ser, "r vbus_voltage")
+    legacy_command(ser, "w axis0.requested_state 8")
+    legacy_command(ser, "w axis1.requested_state 8")
+    elapsed = time.perf_counter() - started
+    ser.close()
+    return elapsed
+
+
+def run_cycles(seconds, cycle):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        cycle_start = time.perf_counter()
+        cycle(len(latencies))
+        latencies.append(time.perf_counter() - cycle_start)
+    latencies.sort()
+    return {
+        'cycles_per_s': len(latencies) / seconds,
+        'cycle_p50_ms': latencies[len(latencies) // 2] * 1000,
+        'cycle_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def bench_transport(fake, baudrate, seconds):
+    odrv = OdriveUart(serial.Serial(fake.port, baudrate, timeout=0.1))
+
+    started = time.perf_counter()
+    odrv.read("vbus_voltage")
+    odrv.set_state(0, 8)
+    odrv.set_state(1, 8)
+    startup = time.perf_counter() - started
+
+    def drive_feedback(i):
+        # Velocity setpoints plus both encoder feedback replies, all pipelined in one round-trip
+        odrv.set_velocities(0.1 * (i % 10), -0.1 * (i % 10))
+        futures = [odrv.request("f 0"), odrv.request("f 1")]
+        for future in futures:
+            odrv.result(future)
+
+    def drive_telemetry(i):
+        odrv.set_velocities(0.1 * (i % 10), -0.1 * (i % 10))
+        odrv.read("vbus_voltage",
+                  "axis0.motor.current_control.Iq_measured",
+                  "axis1.motor.current_control.Iq_measured")
+
+    result = {
+        'startup_s': startup,
+        'drive_feedback': run_cycles(seconds, drive_feedback),
+        'drive_telemetry': run_cycles(seconds, drive_telemetry),
+    }
+    odrv.close()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0, help="duration of each transport loop")
+    parser.add_argument('--baudrate', type=int, default=BAUDRATE)
+    parser.add_argument('--latency-ms', type=float, default=0.2, help="fake ODrive processing time per reply")
+    args = parser.parse_args()
+
+    fake = FakeOdrive(baudrate=args.baudrate, latency=args.latency_ms / 1000)
+    print(f"Fake ODrive on {fake.port} at {args.baudrate} baud")
+    print(f"legacy: vbus read + 2 state writes took {bench_legacy(fake, args.baudrate) * 1000:.0f} ms")
+    result = bench_transport(fake, args.baudrate, args.seconds)
+    print(f"transport: vbus read + 2 state writes took {result['startup_s'] * 1000:.1f} ms")
+    for name, label in (('drive_feedback', "set both axes + f 0/f 1"),
+                        ('drive_telemetry', "set both axes + read vbus and both Iq")):
+        r = result[name]
+        print(f"transport: {r['cycles_per_s']:.0f} Hz ({label}), "
+              f"p50 {r['cycle_p50_ms']:.2f} ms, p99 {r['cycle_p99_ms']:.2f} ms")
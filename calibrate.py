@@ -1,7 +1,52 @@
+import argparse
+import json
+import math
+import os
 import odrive
 import time
+from contextlib import contextmanager
+from odrive import enums
 from odrive.enums import *
 
+from remote import resolve
+
+AXES = ("axis0", "axis1")
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "odrive_profiles.json")
+
+# Changing any of these invalidates a stored encoder calibration
+CALIBRATION_FIELDS = (
+    "motor.config.pole_pairs",
+    "encoder.config.mode",
+    "encoder.config.cpr",
+    "encoder.config.calib_scan_distance",
+)
+
+
+class PhaseTimer:
+    """Times the phases of a run and prints a summary at the end"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        print(f"\n== {name}")
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.phases.append((name, elapsed))
+            print(f"== {name} took {elapsed:.2f}s")
+
+    def summary(self):
+        print("\nPhase timings:")
+        for name, elapsed in self.phases:
+            print(f"  {name:<12} {elapsed:7.2f}s")
+        print(f"  {'total':<12} {time.monotonic() - self.started:7.2f}s")
+
 
 def dump_axis_errors(axis, axis_name):
     print(f"{axis_name} error: {axis.error}")
@@ -10,11 +55,28 @@ def dump_axis_errors(axis, axis_name):
     print(f"  controller error: {axis.controller.error}")
 
 
-def wait_for_calibration(axis):
-    print(f"Waiting for {axis.requested_state}")
-    while axis.current_state != AXIS_STATE_IDLE:
-        time.sleep(0.1)
-    print("Done!")
+def wait_for_idle(axes, timeout=60.0, min_interval=0.01, max_interval=0.25):
+    """Wait until every axis has taken its requested state and dropped back to idle.
+
+    Polls quickly right after the request, when a failed calibration falls straight back to idle,
+    then backs off while the motors turn so a long scan costs only a few USB reads.
+    """
+    deadline = time.monotonic() + timeout
+    interval = min_interval
+    pending = dict(axes)
+    while True:
+        for name, axis in list(pending.items()):
+            # requested_state goes back to UNDEFINED once the axis has picked the request up,
+            # so a poll that lands before the transition doesn't look finished
+            if axis.requested_state == AXIS_STATE_UNDEFINED and axis.current_state == AXIS_STATE_IDLE:
+                print(f"{name} idle after {timeout - (deadline - time.monotonic()):.2f}s")
+                del pending[name]
+        if not pending:
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{', '.join(pending)} still busy after {timeout:.0f}s")
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
 
 
 def save_and_reboot(odrv0):
@@ -25,80 +87,149 @@ def save_and_reboot(odrv0):
         print("reboot")
 
 
-def config(odrv0, axis, axis_name):
-    print(f"\n--- Testing {axis_name} (with hall sensors, bypass motor cal) ---")
-    # Clear errors
+def clear_errors(axis):
     axis.error = 0
     axis.motor.error = 0
     axis.encoder.error = 0
     axis.controller.error = 0
 
-    axis.motor.config.pole_pairs = 15
-    axis.motor.config.resistance_calib_max_voltage = 4
-    axis.motor.config.requested_current_range = 25  # Requires config save and reboot
-    axis.motor.config.current_control_bandwidth = 100
-    axis.motor.config.torque_constant = 8.27 / 16
-
-    axis.encoder.config.mode = ENCODER_MODE_HALL
-    axis.encoder.config.cpr = 90
-    axis.encoder.config.calib_scan_distance = 150
-
-    axis.encoder.config.bandwidth = 100
-    axis.controller.config.pos_gain = 1
-    axis.controller.config.vel_gain = (
-        0.02 * axis.motor.config.torque_constant * axis.encoder.config.cpr
-    )
-    axis.controller.config.vel_integrator_gain = (
-        0.1 * axis.motor.config.torque_constant * axis.encoder.config.cpr
-    )
-    axis.controller.config.vel_limit = 10
-    axis.controller.config.control_mode = CONTROL_MODE_VELOCITY_CONTROL
-
-    # Skip motor calibration
-    axis.motor.config.phase_resistance = 0.15
-    axis.motor.config.phase_inductance = 0.00015
-    axis.motor.config.pre_calibrated = True
 
-
-def calibrate(odrv0, axis, axis_name):
-    axis.requested_state = AXIS_STATE_ENCODER_HALL_POLARITY_CALIBRATION
-    wait_for_calibration(axis)
-
-    axis.requested_state = AXIS_STATE_ENCODER_OFFSET_CALIBRATION
-    wait_for_calibration(axis)
-
-    axis.encoder.config.pre_calibrated = True
-
-    dump_axis_errors(axis, axis_name)
-
-    if axis.error != 0:
-        print(f"{axis_name} encoder calibration failed!")
+def load_profile(name, path=PROFILES_FILE):
+    """Flatten a named profile into {property path: value}, e.g. {'axis0.encoder.config.cpr': 90}.
+
+    "device" fields are used as-is, "axis" fields apply to every axis and "axis0"/"axis1" override
+    them per axis. String values name odrive.enums constants.
+    """
+    with open(path) as f:
+        profiles = json.load(f)
+    if name not in profiles:
+        raise ValueError(f"Unknown profile {name}, {path} has: {', '.join(profiles)}")
+    profile = profiles[name]
+    fields = dict(profile.get("device", {}))
+    for axis in AXES:
+        for field, value in {**profile.get("axis", {}), **profile.get(axis, {})}.items():
+            fields[f"{axis}.{field}"] = value
+    return {path: getattr(enums, value) if isinstance(value, str) else value for path, value in fields.items()}
+
+
+def read_fields(odrv0, paths):
+    """Read every property up front, before anything is written"""
+    values = {}
+    for path in paths:
+        obj, attr = resolve(odrv0, path)
+        values[path] = getattr(obj, attr)
+    return values
+
+
+def same(current, wanted):
+    # The board stores float32, so 0.15 reads back as 0.15000000596
+    if isinstance(current, float) or isinstance(wanted, float):
+        return math.isclose(current, wanted, rel_tol=1e-6, abs_tol=1e-9)
+    return current == wanted
+
+
+def diff_fields(current, wanted):
+    """[(path, old, new)] for the fields whose value on the board differs from the profile"""
+    return [(path, current[path], value) for path, value in wanted.items() if not same(current[path], value)]
+
+
+def write_fields(odrv0, changes):
+    for path, _, value in changes:
+        obj, attr = resolve(odrv0, path)
+        setattr(obj, attr, value)
+
+
+def calibrate(axes):
+    """Run hall polarity then offset calibration on all axes at once; returns True if every axis passed"""
+    for state in (AXIS_STATE_ENCODER_HALL_POLARITY_CALIBRATION, AXIS_STATE_ENCODER_OFFSET_CALIBRATION):
+        for axis in axes.values():
+            axis.requested_state = state
+        wait_for_idle(axes)
+
+        failed = [name for name, axis in axes.items() if axis.error != 0]
+        if failed:
+            for name, axis in axes.items():
+                dump_axis_errors(axis, name)
+            print(f"{', '.join(failed)} encoder calibration failed!")
+            return False
+
+    for name, axis in axes.items():
+        axis.encoder.config.pre_calibrated = True
+        dump_axis_errors(axis, name)
+
+    print("Hall sensor calibration successful!")
+    return True
+
+
+def needs_calibration(odrv0, axis_name, changes):
+    """The encoder has to be calibrated again if it never was or a field it depends on changed"""
+    changed = {path for path, _, _ in changes}
+    if any(f"{axis_name}.{field}" in changed for field in CALIBRATION_FIELDS):
+        return True
+    return not getattr(odrv0, axis_name).encoder.config.pre_calibrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply an ODrive config profile, writing only what differs")
+    parser.add_argument("profile", nargs="?", default="hoverboard")
+    parser.add_argument("--profiles", default=PROFILES_FILE, help="profiles file (default: %(default)s)")
+    parser.add_argument("--erase", action="store_true", help="erase the board first and recommission from scratch")
+    parser.add_argument("--recalibrate", action="store_true", help="calibrate even if the stored calibration is valid")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+    if args.erase and args.dry_run:
+        # The diff against the current board says nothing about an erased one, and erasing isn't dry
+        parser.error("--erase can't be combined with --dry-run")
+
+    wanted = load_profile(args.profile, args.profiles)
+    timer = PhaseTimer()
+
+    if args.erase:
+        with timer.phase("erase"):
+            odrv0 = odrive.find_any()
+            try:
+                odrv0.erase_configuration()
+            except:
+                print("erased")
+
+    with timer.phase("read"):
+        odrv0 = odrive.find_any()
+        changes = diff_fields(read_fields(odrv0, wanted), wanted)
+        stale = [name for name in AXES if args.recalibrate or needs_calibration(odrv0, name, changes)]
+        for path, old, new in changes:
+            print(f"  {path}: {old} -> {new}")
+        print(f"{len(changes)} of {len(wanted)} fields differ from profile {args.profile}")
+
+    if args.dry_run:
+        print(f"Would calibrate: {', '.join(stale) or 'nothing'}")
+        timer.summary()
         return
 
-    print("Hall sensor calibration successful! Entering closed loop control...")
-
-
-odrv0 = odrive.find_any()
-try:
-    odrv0.erase_configuration()
-except:
-    print("erased")
-
-
-odrv0 = odrive.find_any()
-odrv0.config.enable_uart = True
-odrv0.config.uart_baudrate = 115200
-
-odrv0 = odrive.find_any()
-config(odrv0, odrv0.axis0, "axis0")
-save_and_reboot(odrv0)
-odrv0 = odrive.find_any()
-calibrate(odrv0, odrv0.axis0, "axis0")
-save_and_reboot(odrv0)
-
-odrv0 = odrive.find_any()
-config(odrv0, odrv0.axis1, "axis1")
-save_and_reboot(odrv0)
-odrv0 = odrive.find_any()
-calibrate(odrv0, odrv0.axis1, "axis1")
-save_and_reboot(odrv0)
+    if changes:
+        with timer.phase("configure"):
+            write_fields(odrv0, changes)
+            for name in stale:
+                # Don't boot with an offset that no longer matches the config
+                getattr(odrv0, name).encoder.config.pre_calibrated = False
+            # One save and reboot covers every field, including the ones that only apply after a reboot
+            save_and_reboot(odrv0)
+            odrv0 = odrive.find_any()
+
+    calibrated = False
+    if stale:
+        with timer.phase("calibrate"):
+            axes = {name: getattr(odrv0, name) for name in stale}
+            for axis in axes.values():
+                clear_errors(axis)
+            calibrated = calibrate(axes)
+            if calibrated:
+                save_and_reboot(odrv0)
+    else:
+        print("\nStored encoder calibration still valid, skipping calibration")
+
+    print(f"\nChanged {len(changes)} fields, calibrated {', '.join(stale) if calibrated else 'nothing'}")
+    timer.summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,125 @@
 # webcam_server.py
-from flask import Flask, Response, render_template_string
-import cv2
-import odrive
-from odrive.enums import AXIS_STATE_CLOSED_LOOP_CONTROL, AXIS_STATE_IDLE
+from flask import Flask, Response, abort
 import time
 import signal
 import sys
 import atexit
-import threading
+import os
 from flask import request, jsonify
-
-app = Flask(__name__)
-
-# Capture video from the first camera (usually /dev/video0)
-camera = cv2.VideoCapture(0)
-
-# Set camera properties for better performance
-camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-camera.set(cv2.CAP_PROP_FPS, 15)  # Reduce FPS for better streaming
-
-# Global variables for cleanup
-odrv0 = None
-axis0 = None
-axis1 = None
+from video import FrameHub, CaptureProcess, supervise_camera, multipart_chunks, socket_backlog
+from motors import (ControlLoop, ControlChannel, open_backend, mix, wheel_velocities, finite, TELEMETRY_NAMES,
+                    AXIS_STATE_CLOSED_LOOP_CONTROL, AXIS_STATE_IDLE, CONTROL_TIME)
+from telemetry import TelemetrySampler, StatusStream
+from supervisor import Supervisor
+from assets import StaticAssets
+from session import SessionRecorder
+from archive import TelemetryArchive
+from recording import VideoRecorder, Playback
+from vision import VisionStage, load_processors
+import metrics
+
+# static/ is served by StaticAssets with compression and cache headers, not Flask's plain static route
+app = Flask(__name__, static_folder=None)
+
+# WebSocket control channel is optional; the page falls back to POST /control without it
+try:
+    from flask_sock import Sock
+    sock = Sock(app)
+except ImportError:
+    sock = None
+
+# Server mode: threaded (Flask dev server, a thread per connection) or async (aiohttp, one event loop)
+SERVER_MODE = os.environ.get("SERVER_MODE", "threaded")
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", 4))  # executor threads for blocking work in async mode
+PORT = int(os.environ.get("PORT", 5000))
+
+# Camera configuration (override with environment variables)
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "device")  # device, or synthetic for a generated test pattern
+CAMERA_INDEX = int(os.environ.get("CAMERA_INDEX", 0))
+CAMERA_WIDTH = int(os.environ.get("CAMERA_WIDTH", 640))
+CAMERA_HEIGHT = int(os.environ.get("CAMERA_HEIGHT", 480))
+CAMERA_FPS = int(os.environ.get("CAMERA_FPS", 15))
+CAMERA_MJPEG = os.environ.get("CAMERA_MJPEG", "1") == "1"  # forward the camera's own JPEGs when supported
+JPEG_QUALITY = int(os.environ.get("JPEG_QUALITY", 80))
+VIDEO_ADAPTIVE = os.environ.get("VIDEO_ADAPTIVE", "1") == "1"  # per-client quality/resolution/fps ladder
+CHANGE_THRESHOLD = float(os.environ.get("CHANGE_THRESHOLD", 2.0))  # mean gray-level change to send a frame, 0 sends all
+KEEPALIVE_SECONDS = float(os.environ.get("KEEPALIVE_SECONDS", 1.0))  # resend a static scene this often
+VIDEO_PROCESS = os.environ.get("VIDEO_PROCESS", "0") == "1"  # capture and encode in a separate process
+
+# Onboard recording of the encoded stream (off when VIDEO_RECORD_DIR is empty)
+VIDEO_RECORD_DIR = os.environ.get("VIDEO_RECORD_DIR", "")
+VIDEO_RECORD_SEGMENT_SECONDS = float(os.environ.get("VIDEO_RECORD_SEGMENT_SECONDS", 60))
+VIDEO_RECORD_MAX_MB = float(os.environ.get("VIDEO_RECORD_MAX_MB", 2048))  # oldest segments are deleted past this
+VIDEO_RECORD_FPS = float(os.environ.get("VIDEO_RECORD_FPS", 0))  # record at most this many frames/s, 0 for all
+
+# Vision processors run on the live frames, as comma-separated module:Class (off when empty),
+# e.g. vision:Brightness,vision:Markers
+VISION_PROCESSORS = os.environ.get("VISION_PROCESSORS", "")
+VISION_WORKERS = int(os.environ.get("VISION_WORKERS", 2))
+VISION_PROCESSES = os.environ.get("VISION_PROCESSES", "0") == "1"  # run processors in worker processes, not threads
+VISION_MAX_LATENCY = float(os.environ.get("VISION_MAX_LATENCY", 1.0))  # drop a processor that keeps taking longer
+
+# Motor backend: usb (odrive package), uart (ASCII protocol) or sim (no hardware needed)
+MOTOR_BACKEND = os.environ.get("MOTOR_BACKEND", "usb")
+UART_PORT = os.environ.get("UART_PORT", "/dev/ttyACM0")
+UART_BAUDRATE = int(os.environ.get("UART_BAUDRATE", 115200))
+SIM_LATENCY = float(os.environ.get("SIM_LATENCY", 0.002))  # seconds per simulated ODrive command
+
+# Motor control loop configuration
+CONTROL_RATE_HZ = float(os.environ.get("CONTROL_RATE_HZ", 100))
+CONTROL_MAX_ACCEL = float(os.environ.get("CONTROL_MAX_ACCEL", 4.0))  # turns/s^2
+CONTROL_TIMEOUT = float(os.environ.get("CONTROL_TIMEOUT", 0.5))  # stop if no input for this long
+
+# Control commands are logged as JSON lines, at most one per this many seconds
+LOG_INTERVAL = float(os.environ.get("LOG_INTERVAL", 1.0))
+
+# Record control inputs, setpoints and telemetry to a new log in this directory per run (off when empty)
+SESSION_DIR = os.environ.get("SESSION_DIR", "")
+
+# Telemetry sampler configuration
+TELEMETRY_RATE_HZ = float(os.environ.get("TELEMETRY_RATE_HZ", 20))
+TELEMETRY_HISTORY_SECONDS = float(os.environ.get("TELEMETRY_HISTORY_SECONDS", 600))
+TELEMETRY_ARCHIVE_DIR = os.environ.get("TELEMETRY_ARCHIVE_DIR", "")  # keep every sample on disk here (off when empty)
+TELEMETRY_RETENTION_DAYS = float(os.environ.get("TELEMETRY_RETENTION_DAYS", 30))
+
+camera_args = dict(source=CAMERA_SOURCE, index=CAMERA_INDEX, width=CAMERA_WIDTH, height=CAMERA_HEIGHT,
+                   fps=CAMERA_FPS, mjpeg=CAMERA_MJPEG)
+hub_args = dict(quality=JPEG_QUALITY, change_threshold=CHANGE_THRESHOLD, keepalive=KEEPALIVE_SECONDS)
+
+# One capture/encode loop shared by every /video_feed client
+if VIDEO_PROCESS:
+    # The first worker is forked before any other thread so the fork is clean
+    capture = CaptureProcess(camera_args, hub_args)
+    frame_hub = capture.hub
+else:
+    frame_hub = FrameHub(**hub_args)
+
+vision = None
+if VISION_PROCESSORS:
+    # Created, and its worker processes forked, before the camera and recording threads below start
+    vision = VisionStage(frame_hub, load_processors(VISION_PROCESSORS), workers=VISION_WORKERS,
+                         use_processes=VISION_PROCESSES, max_latency=VISION_MAX_LATENCY)
+
+if VIDEO_PROCESS:
+    # Respawns the worker if it dies
+    camera_status = capture.supervise().status
+else:
+    # Capture video from the first camera (usually /dev/video0), opened in the background
+    camera_status = supervise_camera(frame_hub, camera_args).status
+frame_hub.start()
+
+playback = None
+if VIDEO_RECORD_DIR:
+    video_recorder = VideoRecorder(frame_hub, VIDEO_RECORD_DIR, segment_seconds=VIDEO_RECORD_SEGMENT_SECONDS,
+                                   max_bytes=int(VIDEO_RECORD_MAX_MB * 2 ** 20), max_fps=VIDEO_RECORD_FPS)
+    video_recorder.start()
+    playback = Playback(VIDEO_RECORD_DIR)
+
+if vision:
+    vision.start()
 
 # Global variables for status
-battery_voltage = 0.0
-motor_currents = [0.0, 0.0]
-motor_temperatures = [0.0, 0.0]
-uptime = 0
+start_time = time.time()
 
 def get_battery_percentage(voltage):
     """Convert voltage to battery percentage (assuming 4S LiPo: 16.8V full, 12.6V empty)"""
@@ -40,35 +130,14 @@ def get_battery_percentage(voltage):
     else:
         return int(((voltage - 12.6) / (16.8 - 12.6)) * 100)
 
-def get_battery_status():
-    """Get battery and motor status from ODrive"""
-    global battery_voltage, motor_currents, motor_temperatures
-    try:
-        if odrv0:
-            battery_voltage = odrv0.vbus_voltage
-            motor_currents = [axis0.motor.current_control.Iq_measured, axis1.motor.current_control.Iq_measured]
-            # Note: ODrive doesn't have built-in temperature sensors, but we can monitor current as a proxy
-            motor_temperatures = [abs(current) * 10 for current in motor_currents]  # Rough estimate
-    except Exception as e:
-        print(f"Error reading status: {e}")
-
-def status_monitor():
-    """Background thread to monitor system status"""
-    global uptime
-    start_time = time.time()
-    while True:
-        uptime = int(time.time() - start_time)
-        get_battery_status()
-        time.sleep(1)
-
 def cleanup_motors():
     """Cleanup function to stop motors and return to idle state"""
-    global axis0, axis1
-    if axis0 and axis1:
+    control_loop.stop()
+    motor = motor_supervisor.device
+    if motor:
         print("Returning to idle state...")
         try:
-            axis0.requested_state = AXIS_STATE_IDLE
-            axis1.requested_state = AXIS_STATE_IDLE
+            motor.set_state(AXIS_STATE_IDLE)
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
@@ -78,604 +147,274 @@ def signal_handler(sig, frame):
     cleanup_motors()
     sys.exit(0)
 
+# All velocity writes go through this loop so request handlers never block on the motor link.
+# The loop and the telemetry sampler idle until the motors connect.
+control_loop = ControlLoop(None, rate_hz=CONTROL_RATE_HZ,
+                           max_accel=CONTROL_MAX_ACCEL, timeout=CONTROL_TIMEOUT)
+control_loop.start()
+
+telemetry = TelemetrySampler(None, TELEMETRY_NAMES, rate_hz=TELEMETRY_RATE_HZ,
+                             history_seconds=TELEMETRY_HISTORY_SECONDS)
+telemetry.start()
+
+def connect_motors():
+    motor = open_backend(MOTOR_BACKEND, uart_port=UART_PORT, uart_baudrate=UART_BAUDRATE,
+                         sim_latency=SIM_LATENCY)
+    print(f"\nStarting motors ({MOTOR_BACKEND})")
+    motor.set_state(AXIS_STATE_CLOSED_LOOP_CONTROL)
+    return motor
+
+def motors_connected(motor):
+    control_loop.set_backend(motor)
+    telemetry.read = motor.read_telemetry
+
+def motors_lost(motor):
+    control_loop.set_backend(None)
+    telemetry.read = None
+    motor.close()
+
+# Finds the ODrive in the background and reconnects after repeated write/read failures
+motor_supervisor = Supervisor("ODrive", connect_motors, on_connect=motors_connected, on_disconnect=motors_lost)
+control_loop.on_error = telemetry.on_error = motor_supervisor.failed
+control_loop.on_ok = telemetry.on_ok = motor_supervisor.ok
+motor_supervisor.start()
+
 # Register signal handlers and cleanup
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 atexit.register(cleanup_motors)
 
-try:
-  odrv0 = odrive.find_any(timeout=3)
-  axis0 = odrv0.axis0
-  axis1 = odrv0.axis1
-
-  print("\nStarting motors")
-  axis0.requested_state = AXIS_STATE_CLOSED_LOOP_CONTROL
-  axis1.requested_state = AXIS_STATE_CLOSED_LOOP_CONTROL
-except:
-  print("Odrive failed")
-
-time.sleep(1)
-
-def move(left, right, speed):
-    if axis0 and axis1:
-      axis0.controller.input_vel = right * speed
-      axis1.controller.input_vel = left * -1 * speed
-
-# Start status monitoring thread
-status_thread = threading.Thread(target=status_monitor, daemon=True)
-status_thread.start()
-
-HTML_PAGE = """
-<!doctype html>
-<html>
-<head>
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <style>
-    * {
-      margin: 0;
-      padding: 0;
-      box-sizing: border-box;
-    }
-    
-    body {
-      font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      min-height: 100vh;
-      padding: 20px;
-    }
-    
-    .container {
-      max-width: 1200px;
-      margin: 0 auto;
-      background: rgba(255, 255, 255, 0.95);
-      border-radius: 20px;
-      padding: 20px;
-      box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-    }
-    
-    .header {
-      text-align: center;
-      margin-bottom: 20px;
-      color: #333;
-    }
-    
-    .video-container {
-      text-align: center;
-      margin-bottom: 20px;
-    }
-    
-    .video-container img {
-      max-width: 100%;
-      height: auto;
-      border-radius: 15px;
-      box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-    }
-    
-    .status-grid {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-      gap: 10px;
-      margin-bottom: 15px;
-    }
-    
-    .status-card {
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: white;
-      padding: 10px;
-      border-radius: 10px;
-      text-align: center;
-      box-shadow: 0 3px 10px rgba(0,0,0,0.1);
-    }
-    
-    .status-card > div:first-child {
-      font-size: 12px;
-      margin-bottom: 3px;
-    }
-    
-    .status-value {
-      font-size: 18px;
-      font-weight: bold;
-      margin: 3px 0;
-    }
-    
-    .status-card > div:last-child {
-      font-size: 10px;
-      opacity: 0.9;
-    }
-    
-    .battery-bar {
-      width: 100%;
-      height: 12px;
-      background: rgba(255,255,255,0.3);
-      border-radius: 6px;
-      overflow: hidden;
-      margin-top: 5px;
-    }
-    
-    .battery-fill {
-      height: 100%;
-      background: linear-gradient(90deg, #ff4757, #ffa502, #2ed573);
-      transition: width 0.3s ease;
-    }
-    
-    .controls-section {
-      display: flex;
-      flex-direction: column;
-      align-items: center;
-      gap: 15px;
-    }
-    
-    .keyboard-hint {
-      background: rgba(102, 126, 234, 0.1);
-      padding: 8px 15px;
-      border-radius: 8px;
-      text-align: center;
-      color: #667eea;
-      font-weight: 500;
-      font-size: 14px;
-    }
-    
-    .speed-control {
-      background: rgba(255, 255, 255, 0.9);
-      padding: 12px;
-      border-radius: 12px;
-      text-align: center;
-      box-shadow: 0 3px 10px rgba(0,0,0,0.1);
-      margin-bottom: 15px;
-    }
-    
-    .speed-control > div:first-child {
-      font-size: 14px;
-      margin-bottom: 5px;
-    }
-    
-    .speed-slider {
-      width: 180px;
-      height: 6px;
-      border-radius: 3px;
-      background: #ddd;
-      outline: none;
-      margin: 8px 0;
-    }
-    
-    .speed-slider::-webkit-slider-thumb {
-      appearance: none;
-      width: 16px;
-      height: 16px;
-      border-radius: 50%;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      cursor: pointer;
-      box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    .speed-slider::-moz-range-thumb {
-      width: 16px;
-      height: 16px;
-      border-radius: 50%;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      cursor: pointer;
-      border: none;
-      box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    .speed-value {
-      font-size: 16px;
-      font-weight: bold;
-      color: #667eea;
-    }
-    
-    #joystick {
-      width: 220px;
-      height: 220px;
-      background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-      border-radius: 50%;
-      position: relative;
-      touch-action: none;
-      box-shadow: 0 10px 25px rgba(0,0,0,0.2);
-      border: 4px solid white;
-    }
-    
-    #stick {
-      width: 60px;
-      height: 60px;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      border-radius: 50%;
-      position: absolute;
-      left: 80px;
-      top: 80px;
-      touch-action: none;
-      box-shadow: 0 5px 15px rgba(0,0,0,0.3);
-      border: 3px solid white;
-      transition: all 0.1s ease;
-    }
-    
-    .mobile-controls {
-      display: none;
-      grid-template-columns: repeat(3, 1fr);
-      gap: 12px;
-      margin-top: 15px;
-    }
-    
-    .mobile-btn {
-      padding: 15px;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: white;
-      border: none;
-      border-radius: 12px;
-      font-size: 20px;
-      font-weight: bold;
-      touch-action: manipulation;
-      box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-    }
-    
-    .mobile-btn:active {
-      transform: scale(0.95);
-    }
-    
-    @media (max-width: 768px) {
-      .container {
-        padding: 12px;
-        margin: 8px;
-      }
-      
-      .status-grid {
-        grid-template-columns: repeat(2, 1fr);
-        gap: 8px;
-      }
-      
-      .mobile-controls {
-        display: grid;
-      }
-      
-      #joystick {
-        width: 180px;
-        height: 180px;
-      }
-      
-      #stick {
-        width: 50px;
-        height: 50px;
-        left: 65px;
-        top: 65px;
-      }
-      
-      .speed-slider {
-        width: 140px;
-      }
-    }
-  </style>
-</head>
-<body>
-  <div class="container">
-    <div class="video-container">
-      <img src="{{ url_for('video_feed') }}" alt="Robot Camera Feed" id="video-feed">
-    </div>
-    
-    <div class="status-grid">
-      <div class="status-card">
-        <div>🔋 Battery</div>
-        <div class="status-value" id="battery-percentage">--%</div>
-        <div class="battery-bar">
-          <div class="battery-fill" id="battery-fill"></div>
-        </div>
-        <div id="battery-voltage">--V</div>
-      </div>
-      
-      <div class="status-card">
-        <div>⚡ Current</div>
-        <div class="status-value" id="motor-current">--A</div>
-        <div>Motor Load</div>
-      </div>
-      
-      <div class="status-card">
-        <div>🌡️ Temperature</div>
-        <div class="status-value" id="motor-temp">--°C</div>
-        <div>Motor Temp</div>
-      </div>
-      
-      <div class="status-card">
-        <div>⏱️ Uptime</div>
-        <div class="status-value" id="uptime">--s</div>
-        <div>Running Time</div>
-      </div>
-    </div>
-    
-    <div class="speed-control">
-      <div>🚀 Speed Control</div>
-      <input type="range" min="0.1" max="1.5" step="0.1" value="0.4" class="speed-slider" id="speed-slider">
-      <div class="speed-value" id="speed-value">0.4x</div>
-    </div>
-    
-    <div class="controls-section">
-      <div class="keyboard-hint">
-        💡 Use arrow keys or WASD to control the robot
-      </div>
-      
-      <div id="joystick">
-        <div id="stick"></div>
-      </div>
-      
-      <div class="mobile-controls">
-        <button class="mobile-btn" data-action="forward">⬆️</button>
-        <button class="mobile-btn" data-action="left">⬅️</button>
-        <button class="mobile-btn" data-action="stop">⏹️</button>
-        <button class="mobile-btn" data-action="right">➡️</button>
-        <button class="mobile-btn" data-action="backward">⬇️</button>
-      </div>
-    </div>
-  </div>
-
-<script>
-const stick = document.getElementById('stick');
-const joystick = document.getElementById('joystick');
-const mobileBtns = document.querySelectorAll('.mobile-btn');
-const speedSlider = document.getElementById('speed-slider');
-const speedValue = document.getElementById('speed-value');
-
-let dragging = false;
-let lastSendTime = 0;
-const THROTTLE_MS = 100;
-let currentX = 0;
-let currentY = 0;
-let currentSpeed = 1.0;
-
-// Speed control
-speedSlider.addEventListener('input', function() {
-  currentSpeed = parseFloat(this.value);
-  speedValue.textContent = currentSpeed.toFixed(1) + 'x';
-});
-
-// Status update function
-function updateStatus() {
-  fetch('/status')
-    .then(res => res.json())
-    .then(data => {
-      document.getElementById('battery-percentage').textContent = data.battery_percentage + '%';
-      document.getElementById('battery-voltage').textContent = data.battery_voltage.toFixed(1) + 'V';
-      document.getElementById('battery-fill').style.width = data.battery_percentage + '%';
-      document.getElementById('motor-current').textContent = data.motor_current.toFixed(2) + 'A';
-      document.getElementById('motor-temp').textContent = data.motor_temp.toFixed(1) + '°C';
-      document.getElementById('uptime').textContent = data.uptime + 's';
-    })
-    .catch(err => console.log('Status update failed:', err));
-}
-
-// Update status every 2 seconds
-setInterval(updateStatus, 2000);
-updateStatus(); // Initial update
-
-// Joystick controls
-joystick.addEventListener('pointerdown', e => {
-  dragging = true;
-  e.preventDefault();
-});
-
-document.addEventListener('pointerup', e => {
-  if (dragging) {
-    dragging = false;
-    resetJoystick();
-    sendJoystick(0, 0);
-  }
-});
-
-document.addEventListener('pointermove', e => {
-  if (!dragging) return;
-  e.preventDefault();
-  
-  const rect = joystick.getBoundingClientRect();
-  let x = e.clientX - rect.left - 110; // Adjusted for smaller joystick
-  let y = e.clientY - rect.top - 110;
-
-  const dist = Math.sqrt(x*x + y*y);
-  const maxDist = 110; // Adjusted for smaller joystick
-  if (dist > maxDist) {
-    x = x * maxDist / dist;
-    y = y * maxDist / dist;
-  }
-
-  stick.style.left = `${x + 110 - 30}px`; // Adjusted positioning
-  stick.style.top = `${y + 110 - 30}px`;
-
-  currentX = x / maxDist;
-  currentY = -y / maxDist;
-  sendJoystick(currentX, currentY);
-});
-
-function resetJoystick() {
-  stick.style.left = '80px'; // Adjusted for smaller joystick
-  stick.style.top = '80px';
-  currentX = 0;
-  currentY = 0;
-}
-
-// Keyboard controls
-const keyMap = {
-  'ArrowUp': [0, 1],
-  'ArrowDown': [0, -1],
-  'ArrowLeft': [-1, 0],
-  'ArrowRight': [1, 0],
-  'KeyW': [0, 1],
-  'KeyS': [0, -1],
-  'KeyA': [-1, 0],
-  'KeyD': [1, 0]
-};
-
-// Track currently pressed keys
-const pressedKeys = new Set();
-
-document.addEventListener('keydown', e => {
-  if (keyMap[e.code]) {
-    e.preventDefault();
-    pressedKeys.add(e.code);
-    updateMovementFromKeys();
-  }
-});
-
-document.addEventListener('keyup', e => {
-  if (keyMap[e.code]) {
-    e.preventDefault();
-    pressedKeys.delete(e.code);
-    updateMovementFromKeys();
-  }
-});
-
-function updateMovementFromKeys() {
-  let x = 0, y = 0;
-  
-  // Calculate combined movement from all pressed keys
-  for (const key of pressedKeys) {
-    const [keyX, keyY] = keyMap[key];
-    x += keyX;
-    y += keyY;
-  }
-  
-  // Normalize diagonal movement to prevent faster diagonal speed
-  if (x !== 0 && y !== 0) {
-    x *= 0.707; // 1/√2
-    y *= 0.707;
-  }
-  
-  // Clamp to [-1, 1] range
-  x = Math.max(-1, Math.min(1, x));
-  y = Math.max(-1, Math.min(1, y));
-  
-  currentX = x;
-  currentY = y;
-  
-  if (pressedKeys.size === 0) {
-    // No keys pressed, reset joystick
-    resetJoystick();
-    sendJoystick(0, 0);
-  } else {
-    // Update joystick visual and send movement
-    updateJoystickVisual(x, y);
-    sendJoystick(x, y);
-  }
-}
-
-function updateJoystickVisual(x, y) {
-  const maxDist = 110; // Adjusted for smaller joystick
-  const visualX = x * maxDist;
-  const visualY = -y * maxDist;
-  stick.style.left = `${visualX + 110 - 30}px`; // Adjusted positioning
-  stick.style.top = `${visualY + 110 - 30}px`;
-}
-
-// Mobile button controls
-mobileBtns.forEach(btn => {
-  btn.addEventListener('touchstart', e => {
-    e.preventDefault();
-    const action = btn.dataset.action;
-    let x = 0, y = 0;
-    
-    switch(action) {
-      case 'forward': y = 1; break;
-      case 'backward': y = -1; break;
-      case 'left': x = -1; break;
-      case 'right': x = 1; break;
-      case 'stop': x = 0; y = 0; break;
-    }
-    
-    currentX = x;
-    currentY = y;
-    updateJoystickVisual(x, y);
-    sendJoystick(x, y);
-  });
-  
-  btn.addEventListener('touchend', e => {
-    e.preventDefault();
-    resetJoystick();
-    sendJoystick(0, 0);
-  });
-});
-
-function sendJoystick(x, y) {
-  const now = Date.now();
-  // Bypass throttling for stop signals (x=0, y=0)
-  if (x === 0 && y === 0) {
-    lastSendTime = now;
-  } else if (now - lastSendTime < THROTTLE_MS) {
-    return; // Skip if not enough time has passed
-  } else {
-    lastSendTime = now;
-  }
-  
-  fetch('/control', {
-    method: 'POST',
-    headers: {'Content-Type': 'application/json'},
-    body: JSON.stringify({x, y, speed: currentSpeed})
-  })
-  .then(res => res.json())
-  .then(data => {
-    console.log("Wheel output:", data);
-  })
-  .catch(err => console.log('Control failed:', err));
-}
-
-// Prevent context menu on long press
-document.addEventListener('contextmenu', e => e.preventDefault());
-</script>
-</body>
-</html>
-"""
+recorder = None
+if SESSION_DIR:
+    recorder = SessionRecorder(
+        os.path.join(SESSION_DIR, time.strftime("session-%Y%m%d-%H%M%S.tlog")),
+        dict(telemetry=TELEMETRY_NAMES, control_rate_hz=CONTROL_RATE_HZ, max_accel=CONTROL_MAX_ACCEL,
+             timeout=CONTROL_TIMEOUT, motor_backend=MOTOR_BACKEND))
+    atexit.register(recorder.close)
+    print(f"Recording session to {recorder.path}")
+
+# Long-term telemetry history in memory-mapped segment files, beyond what the sampler's ring holds
+archive = None
+if TELEMETRY_ARCHIVE_DIR:
+    archive = TelemetryArchive(TELEMETRY_ARCHIVE_DIR, TELEMETRY_NAMES, rate_hz=TELEMETRY_RATE_HZ,
+                               retention_seconds=TELEMETRY_RETENTION_DAYS * 86400)
+    atexit.register(archive.close)
+
+def on_sample(row):
+    if recorder:
+        recorder.telemetry(row)
+    if archive:
+        archive.append(row)
+
+telemetry.on_sample = on_sample
+
+# UI files, compressed and content-hashed once at startup
+assets = StaticAssets()
+
+def asset_response(result):
+    status, headers, body = result
+    return Response(body, status=status, headers=headers)
 
 def generate_frames():
-    while True:
-        success, frame = camera.read()
-        if not success:
-            break
-        else:
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-
-            # Yield the frame as a multipart HTTP response
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    # Yield the frames as a multipart HTTP response, skipping frames while the client's socket is backed up
+    backlog = socket_backlog(request.environ.get('werkzeug.socket'))
+    return multipart_chunks(frame_hub.frames(adaptive=VIDEO_ADAPTIVE, backlog=backlog))
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_PAGE)
+    return asset_response(assets.index(request.headers.get('Accept-Encoding', ''),
+                                       request.headers.get('If-None-Match', '')))
+
+@app.route('/assets/<digest>/<name>')
+def asset(digest, name):
+    result = assets.get(digest, name, request.headers.get('Accept-Encoding', ''),
+                        request.headers.get('If-None-Match', ''))
+    if result is None:
+        abort(404)
+    return asset_response(result)
 
 @app.route('/video_feed')
 def video_feed():
     return Response(generate_frames(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/status')
-def status():
-    """Return system status including battery level"""
-    battery_percentage = get_battery_percentage(battery_voltage)
-    motor_current = max(abs(current) for current in motor_currents) if motor_currents else 0
-    motor_temp = max(motor_temperatures) if motor_temperatures else 0
-    
+@app.route('/recording/segments')
+def recording_segments():
+    """Recorded segments with their time range, oldest first"""
+    if not playback:
+        abort(404)
+    return jsonify(playback.segments())
+
+@app.route('/recording/frame')
+def recording_frame():
+    """The first recorded frame at or after ?t (epoch seconds)"""
+    found = playback.frame_at(request.args.get('t', 0.0, type=float)) if playback else None
+    if found is None:
+        abort(404)
+    timestamp, frame = found
+    return Response(frame, mimetype='image/jpeg', headers={'X-Frame-Time': f"{timestamp:.3f}"})
+
+@app.route('/recording/stream')
+def recording_stream():
+    """Play the recording from ?t on at ?speed times real time"""
+    if not playback:
+        abort(404)
+    frames = playback.frames(request.args.get('t', 0.0, type=float), speed=request.args.get('speed', 1.0, type=float))
+    return Response(multipart_chunks(frames), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/vision')
+def vision_status():
+    """Latest result, rate and latency of every vision processor"""
+    if not vision:
+        abort(404)
+    return jsonify(vision.status())
+
+@app.route('/vision/overlay')
+def vision_overlay():
+    """Stream the frames ?processor drew its results on"""
+    overlay = vision.overlay(request.args.get('processor', '')) if vision else None
+    if overlay is None:
+        abort(404)
+    backlog = socket_backlog(request.environ.get('werkzeug.socket'))
+    return Response(multipart_chunks(overlay.frames(adaptive=False, backlog=backlog)),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def page_status():
+    """The fields the page renders, from the latest telemetry sample"""
+    sample = telemetry.snapshot()
+    battery_voltage = sample['vbus_voltage'] if sample else 0.0
+    motor_currents = [sample['iq0'], sample['iq1']] if sample else [0.0, 0.0]
+    # Note: ODrive doesn't have built-in temperature sensors, but we can monitor current as a proxy
+    motor_temperatures = [abs(current) * 10 for current in motor_currents]  # Rough estimate
+
     return {
         'battery_voltage': battery_voltage,
-        'battery_percentage': battery_percentage,
-        'motor_current': motor_current,
-        'motor_temp': motor_temp,
-        'uptime': uptime
+        'battery_percentage': get_battery_percentage(battery_voltage),
+        'motor_current': max(abs(current) for current in motor_currents),
+        'motor_temp': max(motor_temperatures),
+        'uptime': int(time.time() - start_time),
     }
 
-@app.route('/control', methods=['POST'])
-def control():
-    data = request.get_json()
+def get_status():
+    """Build the status dict: what the page shows plus the diagnostic counters"""
+    motor = control_loop.backend
+    return dict(page_status(),
+                motor_commands=control_loop.stats(),
+                motor_bus=motor.transactions() if motor else {},
+                devices={'camera': camera_status(), 'motors': motor_supervisor.status()})
+
+def pushed_status():
+    """page_status() rounded to the precision the page displays, so sensor noise alone isn't a change"""
+    status = page_status()
+    status['battery_voltage'] = round(status['battery_voltage'], 1)
+    status['motor_current'] = round(status['motor_current'], 2)
+    status['motor_temp'] = round(status['motor_temp'], 1)
+    return status
+
+# One serialized status payload per telemetry sample, shared by every /status/stream client.
+# Only what the page renders is pushed; the counters in get_status() change every tick and stay on GET /status.
+status_stream = StatusStream(pushed_status, sampler=telemetry)
+status_stream.start()
+
+@app.route('/status')
+def status():
+    """Return system status including battery level"""
+    return get_status()
+
+@app.route('/status/stream')
+def status_stream_feed():
+    """Server-sent status updates, pushed as soon as a new telemetry sample lands"""
+    return Response(status_stream.events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def telemetry_history(seconds=60, points=200, start=None, end=None):
+    """From the in-memory ring when it covers the range, otherwise from the on-disk archive"""
+    if archive and (start is not None or end is not None or seconds > TELEMETRY_HISTORY_SECONDS):
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - seconds
+        return archive.query(start, end, points)
+    return telemetry.history(seconds=seconds, points=points)
+
+@app.route('/status/history')
+def status_history():
+    """Downsampled min/max/mean telemetry for the last ?seconds, or ?start to ?end (epoch seconds),
+    in at most ?points buckets"""
+    seconds = request.args.get('seconds', 60, type=float)
+    points = request.args.get('points', 200, type=int)
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    return telemetry_history(seconds=seconds, points=max(1, points), start=start, end=end)
+
+def drive(x, y, speed):
+    """Map joystick input to differential drive wheel speeds and send them to the motors"""
+    left, right = mix(x, y)
+    vel0, vel1 = wheel_velocities(left, right, speed)
+    control_loop.submit(vel0, vel1)
+    if recorder:
+        recorder.control(x, y, speed)
+        recorder.setpoint(vel0, vel1)
+    return left, right
+
+def control_command(data):
+    """Apply one /control request body and return the wheel output; ValueError if it isn't valid"""
+    started = time.perf_counter()
+    if not isinstance(data, dict):
+        raise ValueError("control body must be a JSON object")
     x = data.get('x', 0)   # horizontal (-1 to 1)
     y = data.get('y', 0)   # vertical (-1 to 1)
     speed = data.get('speed', 1.0)  # speed multiplier (0.1 to 3.0)
+    if not finite(x, y, speed):
+        raise ValueError("x, y and speed must be finite numbers")
 
-    # Map joystick input to differential drive wheel speeds
-    left = y + x
-    right = y - x
+    left, right = drive(x, y, speed)
+    log.log('control', left=left, right=right, speed=speed)
+    CONTROL_TIME['http'].observe(time.perf_counter() - started)
 
-    # Clamp to [-1, 1]
-    left = max(-1, min(1, left))
-    right = max(-1, min(1, right))
+    return dict(left=left, right=right, speed=speed)
 
-    move(left=left, right=right, speed=speed)
-    print(f"{left=}, {right=}, speed={speed}")
+log = metrics.RateLimitedLog(LOG_INTERVAL)
 
-    return jsonify(left=left, right=right, speed=speed)
+@app.route('/control', methods=['POST'])
+def control():
+    try:
+        return jsonify(control_command(request.get_json(silent=True)))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+if sock:
+    @sock.route('/control_ws')
+    def control_ws(ws):
+        """Persistent control channel carrying compact [seq, x, y, speed] messages"""
+        channel = ControlChannel(drive)
+        try:
+            while True:
+                message = ws.receive()
+                # Drain anything that queued up meanwhile so only the newest input gets applied
+                while True:
+                    newer = ws.receive(timeout=0)
+                    if newer is None:
+                        break
+                    message = newer
+                channel.handle(message)
+        finally:
+            channel.close()
+
+# Numbers other parts already keep, read at scrape time
+metrics.gauge('video_viewers', 'Connected /video_feed clients', lambda: frame_hub.clients)
+for name in ('submitted', 'written', 'coalesced', 'timeouts', 'errors', 'overruns'):
+    metrics.gauge(f'motor_commands_{name}_total', f'Control loop {name} count',
+                  lambda name=name: control_loop.stats()[name], kind='counter')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    if SERVER_MODE == "async":
+        from aserve import serve
+        serve(host='0.0.0.0', port=PORT, assets=assets, frame_hub=frame_hub, status_stream=status_stream,
+              get_status=get_status, control_command=control_command, drive=drive, history=telemetry_history, playback=playback,
+              vision=vision, adaptive=VIDEO_ADAPTIVE, workers=ASYNC_WORKERS)
+    else:
+        app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,157 @@
+"""Process-wide counters and histograms, rendered as Prometheus text for /metrics.
+
+Modules register what they measure at import time and observe on the hot path; an observation is
+a bisect and two additions under a lock.
+"""
+import bisect
+import json
+import threading
+import time
+
+# Seconds, 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+# Bytes, 1 KiB to 256 MiB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append((self.name + '_bucket', dict(self.labels, le=le), cumulative))
+        samples.append((self.name + '_sum', self.labels, total))
+        samples.append((self.name + '_count', self.labels, cumulative))
+        return samples
+
+
+class Gauge:
+    """A value read from a callback at scrape time, for numbers something else already keeps"""
+
+    def __init__(self, name, help, labels, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        try:
+            return [(self.name, self.labels, self.read())]
+        except Exception:
+            return []
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}  # (name, labels) -> metric, in registration order
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        """Get or create, so every module asking for the same name and labels shares one metric"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = self.metrics[key] = cls(name, help, labels, **kwargs)
+            return metric
+
+    def counter(self, name, help, **labels):
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def gauge(self, name, help, read, kind='gauge', **labels):
+        return self._get(Gauge, name, help, labels, read=read, kind=kind)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        described = set()
+        for metric in metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                kind = getattr(metric, 'kind', None) or type(metric).__name__.lower()
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} {kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+render = REGISTRY.render
+
+
+class RateLimitedLog:
+    """One JSON line per event name at most every interval seconds, noting how many were dropped"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.last = {}  # event -> monotonic time of the last line
+        self.dropped = {}
+        self.lock = threading.Lock()
+
+    def log(self, event, **fields):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last.get(event, -self.interval) < self.interval:
+                self.dropped[event] = self.dropped.get(event, 0) + 1
+                return
+            self.last[event] = now
+            dropped = self.dropped.pop(event, 0)
+        record = {'time': round(time.time(), 3), 'event': event, **fields}
+        if dropped:
+            record['dropped'] = dropped
+        print(json.dumps(record))
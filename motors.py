@@ -0,0 +1,355 @@
+import json
+import math
+import threading
+import time
+
+import metrics
+from remote import RemoteProperties
+
+# ODrive axis states (odrive.enums), repeated here so the UART and sim backends don't need odrive installed
+AXIS_STATE_IDLE = 1
+AXIS_STATE_CLOSED_LOOP_CONTROL = 8
+
+TELEMETRY_NAMES = ('vbus_voltage', 'iq0', 'iq1', 'vel0', 'vel1')
+TELEMETRY_PATHS = (
+    'vbus_voltage',
+    'axis0.motor.current_control.Iq_measured',
+    'axis1.motor.current_control.Iq_measured',
+    'axis0.encoder.vel_estimate',
+    'axis1.encoder.vel_estimate',
+)
+MOTOR_WRITE = metrics.histogram('motor_write_seconds', 'Time for one velocity write to the motor backend')
+
+# Seconds a telemetry read may be reused; the bus voltage moves slowly, currents and speeds don't
+TELEMETRY_MAX_AGE = {'vbus_voltage': 1.0}
+
+
+class UsbBackend:
+    """ODrive over USB through the odrive package"""
+
+    def __init__(self, timeout=3):
+        import odrive
+        self.odrv = odrive.find_any(timeout=timeout)
+        # Each property access is a USB round-trip, the proxy skips the ones it can
+        self.props = RemoteProperties(self.odrv, max_age=TELEMETRY_MAX_AGE)
+
+    def set_velocities(self, vel0, vel1):
+        # Only touches an axis whose velocity changed
+        self.props.set('axis0.controller.input_vel', vel0)
+        self.props.set('axis1.controller.input_vel', vel1)
+
+    def set_state(self, state):
+        for axis in ('axis0', 'axis1'):
+            self.props.set(f'{axis}.requested_state', state, force=True)
+
+    def close(self):
+        pass
+
+    def read_telemetry(self):
+        return dict(zip(TELEMETRY_NAMES, self.props.read(*TELEMETRY_PATHS)))
+
+    def transactions(self):
+        return self.props.stats()
+
+
+class UartBackend:
+    """ODrive over the ASCII protocol using the pipelined transport from uart.py"""
+
+    def __init__(self, port, baudrate):
+        from uart import OdriveUart
+        self.odrv = OdriveUart.open(port, baudrate)
+        self.props = RemoteProperties(self.odrv, max_age=TELEMETRY_MAX_AGE, read=self.odrv.read, write=self.odrv.write)
+
+    def close(self):
+        self.odrv.close()
+
+    def set_velocities(self, vel0, vel1):
+        self.odrv.set_velocities(vel0, vel1)
+
+    def set_state(self, state):
+        self.odrv.set_state(0, state)
+        self.odrv.set_state(1, state)
+
+    def read_telemetry(self):
+        # The stale reads go out in one write, replies come back pipelined
+        return dict(zip(TELEMETRY_NAMES, self.props.read(*TELEMETRY_PATHS)))
+
+    def transactions(self):
+        return self.props.stats()
+
+
+class SimBackend:
+    """In-process ODrive stand-in with per-command latency and first-order wheel dynamics"""
+
+    def __init__(self, latency=0.002, time_constant=0.15, vbus_voltage=15.8, current_per_accel=0.5,
+                 clock=time.monotonic):
+        self.latency = latency  # seconds each command or read blocks, like a USB round-trip
+        self.clock = clock  # replays pass a virtual clock to run the dynamics faster than real time
+        self.time_constant = time_constant  # wheel speed reaches ~63% of a step in this many seconds
+        self.vbus_voltage = vbus_voltage
+        self.current_per_accel = current_per_accel  # amps of Iq per turn/s^2
+        self.closed_loop = False
+        self.setpoint = [0.0, 0.0]
+        self.vel = [0.0, 0.0]
+        self.iq = [0.0, 0.0]
+        self.updated = clock()
+        self.lock = threading.Lock()
+        self.commands = 0
+        # Goes through the same proxy as the real backends so caching shows up in the command count
+        self.props = RemoteProperties(self, max_age=TELEMETRY_MAX_AGE, read=self._read, write=self._write)
+
+    def _advance(self):
+        now = self.clock()
+        dt = now - self.updated
+        self.updated = now
+        if dt <= 0:
+            return
+        alpha = 1 - math.exp(-dt / self.time_constant)
+        for i in range(2):
+            target = self.setpoint[i] if self.closed_loop else 0.0
+            step = (target - self.vel[i]) * alpha
+            self.vel[i] += step
+            self.iq[i] = self.current_per_accel * step / dt
+
+    def close(self):
+        pass
+
+    def _command(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self.commands += 1
+
+    def _read(self, *paths):
+        # One round-trip for the batch, like the pipelined UART reads
+        self._command()
+        with self.lock:
+            self._advance()
+            # Sag the bus a little under load
+            sag = 0.05 * (abs(self.iq[0]) + abs(self.iq[1]))
+            values = {
+                'vbus_voltage': self.vbus_voltage - sag,
+                'axis0.motor.current_control.Iq_measured': self.iq[0],
+                'axis1.motor.current_control.Iq_measured': self.iq[1],
+                'axis0.encoder.vel_estimate': self.vel[0],
+                'axis1.encoder.vel_estimate': self.vel[1],
+            }
+        return [values[path] for path in paths]
+
+    def _write(self, path, value):
+        self._command()
+        axis, _, prop = path.partition('.')
+        i = int(axis[-1])
+        with self.lock:
+            self._advance()
+            if prop == 'controller.input_vel':
+                self.setpoint[i] = value
+            elif prop == 'requested_state':
+                self.closed_loop = value == AXIS_STATE_CLOSED_LOOP_CONTROL
+
+    def set_velocities(self, vel0, vel1):
+        self.props.set('axis0.controller.input_vel', vel0)
+        self.props.set('axis1.controller.input_vel', vel1)
+
+    def set_state(self, state):
+        for axis in ('axis0', 'axis1'):
+            self.props.set(f'{axis}.requested_state', state, force=True)
+
+    def read_telemetry(self):
+        return dict(zip(TELEMETRY_NAMES, self.props.read(*TELEMETRY_PATHS)))
+
+    def transactions(self):
+        return self.props.stats()
+
+
+def open_backend(name, uart_port="/dev/ttyACM0", uart_baudrate=115200, sim_latency=0.002):
+    """Create the motor backend selected by name: usb, uart or sim"""
+    if name == 'usb':
+        return UsbBackend()
+    if name == 'uart':
+        return UartBackend(uart_port, uart_baudrate)
+    if name == 'sim':
+        return SimBackend(latency=sim_latency)
+    raise ValueError(f"Unknown motor backend: {name}")
+
+
+def finite(*values):
+    """True if every value is a real, finite number; bools, strings, None and NaN are not"""
+    return all(isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+               for value in values)
+
+
+CONTROL_TIME = {transport: metrics.histogram('control_handle_seconds', 'Time to handle one control input',
+                                             transport=transport) for transport in ('http', 'ws')}
+
+
+class ControlChannel:
+    """One operator connection sending compact [seq, x, y, speed] messages, as used by /control_ws.
+
+    Malformed, non-finite, stale and out-of-order messages are dropped. close() stops the wheels,
+    so they never keep turning after the connection drops.
+    """
+
+    def __init__(self, drive):
+        self.drive = drive  # drive(x, y, speed)
+        self.last_seq = -1
+
+    def handle(self, message):
+        started = time.perf_counter()
+        try:
+            seq, x, y, speed = json.loads(message)
+        except (ValueError, TypeError):
+            return
+        if not finite(seq, x, y, speed):
+            return  # a bad seq can't be ordered and bad values mustn't reach the motors
+        if seq <= self.last_seq:
+            return  # stale or out-of-order
+        self.last_seq = seq
+        self.drive(x, y, speed)
+        CONTROL_TIME['ws'].observe(time.perf_counter() - started)
+
+    def close(self):
+        self.drive(0, 0, 0)
+
+
+def mix(x, y):
+    """Joystick input to differential drive (left, right) wheel commands, each clamped to [-1, 1]"""
+    left = max(-1, min(1, y + x))
+    right = max(-1, min(1, y - x))
+    return left, right
+
+
+def wheel_velocities(left, right, speed):
+    """(vel0, vel1) axis velocities for wheel commands; the left motor is mounted mirrored"""
+    return right * speed, left * -1 * speed
+
+
+def ramp(current, target, max_step):
+    """Move current toward target by at most max_step"""
+    if target > current:
+        return min(target, current + max_step)
+    return max(target, current - max_step)
+
+
+class ControlLoop:
+    """Fixed-rate loop that owns the motor backend and ramps it toward the latest setpoint"""
+
+    def __init__(self, backend=None, rate_hz=100, max_accel=4.0, timeout=0.5):
+        # backend can be None while the motors are (re)connecting, the loop keeps ticking without writing
+        self.backend = backend
+        self.on_error = None
+        self.on_ok = None
+        self.period = 1.0 / rate_hz
+        self.max_accel = max_accel  # turns/s^2
+        self.timeout = timeout  # seconds without input before commanding zero
+        # Single-slot mailbox: a new setpoint replaces one the loop hasn't picked up yet
+        self.pending = None
+        self.target = (0.0, 0.0)
+        self.target_time = 0.0
+        self.output = (0.0, 0.0)
+        self.last_written = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.submitted = 0
+        self.written = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.ticks = 0
+        self.overruns = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
+
+    def set_backend(self, backend):
+        # Start from standstill on a fresh connection rather than where the old one left off
+        self.output = (0.0, 0.0)
+        self.last_written = None
+        self.backend = backend
+
+    def submit(self, vel0, vel1):
+        """Set target axis velocities without blocking; returns immediately"""
+        with self.lock:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = (vel0, vel1)
+            self.submitted += 1
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.running:
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            now = time.monotonic()
+            lateness = now - next_tick
+            self.ticks += 1
+            self.jitter_sum += abs(lateness)
+            self.jitter_max = max(self.jitter_max, abs(lateness))
+            if lateness > self.period:
+                # Fell a whole tick behind, resync instead of bursting to catch up
+                self.overruns += 1
+                next_tick = now
+
+            self.step(now)
+
+    def step(self, now):
+        """Run one tick at monotonic time now: take the pending setpoint, ramp and write the output.
+
+        The loop thread calls this every period; session replay calls it directly on a stopped loop.
+        """
+        with self.lock:
+            setpoint, self.pending = self.pending, None
+        if setpoint is not None:
+            self.target = setpoint
+            self.target_time = now
+        elif self.target != (0.0, 0.0) and now - self.target_time > self.timeout:
+            # Operator went quiet (tab closed, link dropped), bring the robot to a stop
+            self.target = (0.0, 0.0)
+            self.timeouts += 1
+
+        max_step = self.max_accel * self.period
+        self.output = (
+            ramp(self.output[0], self.target[0], max_step),
+            ramp(self.output[1], self.target[1], max_step),
+        )
+        backend = self.backend
+        if backend is None or self.output == self.last_written:
+            return
+        try:
+            started = time.perf_counter()
+            backend.set_velocities(*self.output)
+            MOTOR_WRITE.observe(time.perf_counter() - started)
+            self.last_written = self.output
+            self.written += 1
+            if self.on_ok:
+                self.on_ok()
+        except Exception as e:
+            self.errors += 1
+            print(f"Error writing motor command: {e}")
+            if self.on_error:
+                self.on_error(e)
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'jitter_mean_ms': round(self.jitter_sum / self.ticks * 1000, 3) if self.ticks else 0.0,
+            'jitter_max_ms': round(self.jitter_max * 1000, 3),
+        }
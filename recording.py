@@ -0,0 +1,252 @@
+"""Onboard recording of the encoded camera stream into rotating, indexed segment files.
+
+Each segment is a pair of files named after the wall time of its first frame:
+
+    <start>.mjpg   the JPEG frames back to back, exactly as they were streamed
+    <start>.idx    one (time f64, offset u64, length u32) record per frame
+
+Playback seeks with a binary search over the index and reads the frame bytes straight from the
+segment, no decoding involved.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+INDEX_DTYPE = np.dtype([('time', '<f8'), ('offset', '<u8'), ('length', '<u4')])
+
+RECORDED_FRAMES = metrics.counter('recording_frames_total', 'Frames written to the onboard recording')
+RECORDED_BYTES = metrics.counter('recording_bytes_total', 'JPEG bytes written to the onboard recording')
+WRITE_TIME = metrics.histogram('recording_write_seconds', 'Time to append one frame to the recording')
+
+# Recorded seconds between two frames past which playback carries straight on instead of waiting the gap
+# out, such as the server being down between segments. Longer than the hub's 1 s keepalive on a still scene.
+MAX_GAP = 2.0
+
+
+class VideoRecorder:
+    """Follows a FrameHub from its own thread and appends every new frame to the current segment.
+
+    It takes frames the same way a viewer does, newest-only, so a slow disk makes the recording
+    skip frames instead of holding up capture or the live stream.
+    """
+
+    def __init__(self, hub, directory, segment_seconds=60, max_bytes=2 << 30, max_fps=0, flush_interval=1.0):
+        self.hub = hub
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.max_bytes = max_bytes  # oldest segments are deleted to stay under this
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.flush_interval = flush_interval
+        self.data = None
+        self.index = None
+        self.segment_start = None
+        self.offset = 0
+        self.last_flush = 0.0
+        self.running = False
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        self.running = True
+        # Recording counts as a viewer, so the camera keeps capturing with nobody watching
+        self.hub.subscribe(internal=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(2.0)
+
+    def _run(self):
+        seq = None
+        last_time = 0.0
+        try:
+            while self.running:
+                new_seq, frame = self.hub.wait(seq, timeout=1.0)
+                if new_seq == seq or frame is None:
+                    continue
+                seq = new_seq
+                now = time.time()
+                if now - last_time < self.min_interval:
+                    continue
+                last_time = now
+                try:
+                    self._append(now, frame)
+                except OSError as e:
+                    # A full or missing disk shouldn't take the robot down, try again on a fresh segment
+                    print(f"Recording write failed: {e}")
+                    self._close_segment()
+                    time.sleep(1.0)
+        finally:
+            self._close_segment()
+            self.hub.unsubscribe(internal=True)
+
+    def _append(self, timestamp, frame):
+        started = time.perf_counter()
+        if self.data is None or timestamp - self.segment_start >= self.segment_seconds:
+            self._rotate(timestamp)
+        self.data.write(frame)
+        self.index.write(np.array([(timestamp, self.offset, len(frame))], dtype=INDEX_DTYPE).tobytes())
+        self.offset += len(frame)
+        if time.monotonic() - self.last_flush > self.flush_interval:
+            self.index.flush()
+            self.last_flush = time.monotonic()
+        WRITE_TIME.observe(time.perf_counter() - started)
+        RECORDED_FRAMES.inc()
+        RECORDED_BYTES.inc(len(frame))
+
+    def _rotate(self, timestamp):
+        self._close_segment()
+        self._evict()
+        name = f"{timestamp:014.3f}"
+        # Unbuffered, so the frame bytes always reach the file before the index record pointing at them
+        self.data = open(os.path.join(self.directory, name + '.mjpg'), 'ab', buffering=0)
+        self.index = open(os.path.join(self.directory, name + '.idx'), 'ab')
+        self.segment_start = timestamp
+        self.offset = self.data.tell()
+
+    def _close_segment(self):
+        for f in (self.data, self.index):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self.data = self.index = None
+
+    def _evict(self):
+        """Delete the oldest segments until the recording fits in max_bytes"""
+        segments = list_segments(self.directory)
+        total = sum(size for _, size in segments)
+        for name, size in segments:
+            if total <= self.max_bytes:
+                break
+            for extension in ('.mjpg', '.idx'):
+                try:
+                    os.remove(os.path.join(self.directory, name + extension))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def list_segments(directory):
+    """[(name, bytes)] of the segments in directory, oldest first"""
+    segments = []
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith('.mjpg'):
+            name = entry[:-5]
+            size = os.path.getsize(os.path.join(directory, entry))
+            index = os.path.join(directory, name + '.idx')
+            segments.append((name, size + (os.path.getsize(index) if os.path.exists(index) else 0)))
+    return segments
+
+
+def read_index(directory, name):
+    path = os.path.join(directory, name + '.idx')
+    with open(path, 'rb') as f:
+        data = f.read()
+    # The segment being written may end in a partial record
+    return np.frombuffer(data[:len(data) - len(data) % INDEX_DTYPE.itemsize], dtype=INDEX_DTYPE)
+
+
+class Playback:
+    """Seek-by-timestamp reads over a recording directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self):
+        """Start, end, frame count and size of every segment, oldest first"""
+        result = []
+        for name, size in list_segments(self.directory):
+            index = read_index(self.directory, name)
+            if len(index):
+                result.append({'start': float(index['time'][0]), 'end': float(index['time'][-1]),
+                               'frames': len(index), 'bytes': size})
+        return result
+
+    def _locate(self, timestamp):
+        """(segment name, index, position) of the first frame at or after timestamp, or None"""
+        names = [name for name, _ in list_segments(self.directory)]
+        # The segment to start in is the last one that began at or before timestamp
+        starts = [float(name) for name in names]
+        first = max(0, int(np.searchsorted(starts, timestamp, side='right')) - 1)
+        for name in names[first:]:
+            index = read_index(self.directory, name)
+            position = int(np.searchsorted(index['time'], timestamp, side='left'))
+            if position < len(index):
+                return name, index, position
+        return None
+
+    def frame_at(self, timestamp):
+        """(time, JPEG bytes) of the first recorded frame at or after timestamp, or None"""
+        found = self._locate(timestamp)
+        if found is None:
+            return None
+        name, index, position = found
+        entry = index[position]
+        with open(os.path.join(self.directory, name + '.mjpg'), 'rb') as f:
+            f.seek(int(entry['offset']))
+            return float(entry['time']), f.read(int(entry['length']))
+
+    def frames(self, timestamp, speed=1.0):
+        """Yield recorded JPEG frames from timestamp on, paced at speed times the recorded rate"""
+        clock = PlaybackClock(speed)
+        for frame_time, frame in self.read_frames(timestamp):
+            delay = clock.delay(frame_time)
+            if delay > 0:
+                time.sleep(delay)
+            yield frame
+
+    def read_frames(self, timestamp):
+        """Yield (time, JPEG bytes) of the recorded frames from timestamp on, as fast as they read"""
+        found = self._locate(timestamp)
+        if found is None:
+            return
+        name, index, position = found
+        names = [segment for segment, _ in list_segments(self.directory)]
+        while True:
+            try:
+                f = open(os.path.join(self.directory, name + '.mjpg'), 'rb')
+            except FileNotFoundError:
+                return  # evicted while we were playing
+            with f:
+                for entry in index[position:]:
+                    f.seek(int(entry['offset']))
+                    yield float(entry['time']), f.read(int(entry['length']))
+            # Carry on into the next segment, if it's still there
+            later = [segment for segment in names if segment > name]
+            if not later:
+                return
+            name, position = later[0], 0
+            try:
+                index = read_index(self.directory, name)
+            except FileNotFoundError:
+                return
+
+
+class PlaybackClock:
+    """When to show each recorded frame to play at speed times the recorded rate; speed 0 means no pacing"""
+
+    def __init__(self, speed=1.0, max_gap=MAX_GAP):
+        self.speed = speed
+        self.max_gap = max_gap
+        self.started = None
+        self.origin = None
+        self.last = None
+
+    def delay(self, frame_time):
+        """Seconds to wait before showing the frame recorded at frame_time"""
+        now = time.monotonic()
+        if self.origin is None or frame_time - self.last > self.max_gap:
+            # First frame, or a gap in the recording: play on from here rather than sit through it
+            self.started, self.origin = now, frame_time
+        self.last = frame_time
+        if self.speed <= 0:
+            return 0.0
+        return self.started + (frame_time - self.origin) / self.speed - now
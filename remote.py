@@ -0,0 +1,105 @@
+import threading
+import time
+
+
+def resolve(root, path):
+    """Split 'axis0.encoder.vel_estimate' into (root.axis0.encoder, 'vel_estimate')"""
+    *parents, attr = path.split('.')
+    obj = root
+    for parent in parents:
+        obj = getattr(obj, parent)
+    return obj, attr
+
+
+class RemoteProperties:
+    """Cached, counted access to the properties of a remote object tree such as an odrive handle.
+
+    Every attribute read or write on the odrive object is a bus round-trip. Here reads are served
+    from cache while younger than the property's max_age, writes of the value the device already
+    holds are dropped, and each property's real transactions are counted so hot paths show up.
+    """
+
+    def __init__(self, root, max_age=None, read=None, write=None):
+        self.root = root
+        self.max_age = dict(max_age or {})  # path -> seconds a read value stays fresh, default 0
+        # read(*paths) -> values and write(path, value) override attribute access, e.g. to
+        # pipeline a batch of reads over UART
+        self.read_many = read or self._read_attributes
+        self.write_one = write or self._write_attribute
+        self.values = {}  # path -> (value, monotonic time it was read or written)
+        self.counts = {}  # path -> {'reads', 'cached', 'writes', 'suppressed'}
+        self.lock = threading.Lock()
+
+    def _read_attributes(self, *paths):
+        return [getattr(*resolve(self.root, path)) for path in paths]
+
+    def _write_attribute(self, path, value):
+        obj, attr = resolve(self.root, path)
+        setattr(obj, attr, value)
+
+    def _count(self, path, kind):
+        counts = self.counts.get(path)
+        if counts is None:
+            counts = self.counts[path] = {'reads': 0, 'cached': 0, 'writes': 0, 'suppressed': 0}
+        counts[kind] += 1
+
+    def read(self, *paths):
+        """Values of several properties, fetching only the stale ones and those in one batch"""
+        now = time.monotonic()
+        results = {}
+        stale = []
+        with self.lock:
+            for path in paths:
+                cached = self.values.get(path)
+                if cached is not None and now - cached[1] < self.max_age.get(path, 0.0):
+                    results[path] = cached[0]
+                    self._count(path, 'cached')
+                else:
+                    stale.append(path)
+        if stale:
+            values = self.read_many(*stale)
+            now = time.monotonic()
+            with self.lock:
+                for path, value in zip(stale, values):
+                    self.values[path] = (value, now)
+                    results[path] = value
+                    self._count(path, 'reads')
+        return [results[path] for path in paths]
+
+    def get(self, path):
+        return self.read(path)[0]
+
+    def set(self, path, value, force=False):
+        """Write a property unless the device is already known to hold value; returns True if written.
+
+        force is for command-like properties (requested_state) where repeating a write means something.
+        """
+        with self.lock:
+            cached = self.values.get(path)
+            if not force and cached is not None and cached[0] == value:
+                self._count(path, 'suppressed')
+                return False
+        try:
+            self.write_one(path, value)
+        except Exception:
+            # The write may or may not have landed, don't trust the cache for it
+            with self.lock:
+                self.values.pop(path, None)
+            raise
+        with self.lock:
+            self.values[path] = (value, time.monotonic())
+            self._count(path, 'writes')
+        return True
+
+    def invalidate(self, path=None):
+        """Forget cached values, e.g. after the device rebooted or changed state on its own"""
+        with self.lock:
+            if path is None:
+                self.values.clear()
+            else:
+                self.values.pop(path, None)
+
+    def stats(self):
+        """Per-property transaction counts"""
+        with self.lock:
+            return {path: dict(counts) for path, counts in self.counts.items()}
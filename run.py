@@ -1,24 +1,24 @@
-import odrive
-from odrive.enums import *
+import os
 import time
 
+from motors import open_backend, AXIS_STATE_CLOSED_LOOP_CONTROL, AXIS_STATE_IDLE
 
+# usb, uart or sim, same choices as cam.py
+MOTOR_BACKEND = os.environ.get("MOTOR_BACKEND", "usb")
+
+motor = None
 try:
-    odrv0 = odrive.find_any()
-    axis0 = odrv0.axis0
-    axis1 = odrv0.axis1
+    motor = open_backend(MOTOR_BACKEND)
 
     print("\nStarting sensorless control...")
-    axis0.requested_state = AXIS_STATE_CLOSED_LOOP_CONTROL
-    axis1.requested_state = AXIS_STATE_CLOSED_LOOP_CONTROL
+    motor.set_state(AXIS_STATE_CLOSED_LOOP_CONTROL)
 
     time.sleep(1)
-    
+
     speed = 0.3
 
     def move(left,right):
-        axis0.controller.input_vel = right * speed
-        axis1.controller.input_vel = left * -1 * speed
+        motor.set_velocities(right * speed, left * -1 * speed)
         time.sleep(2)
 
     # move(left=1, right=1)
@@ -26,19 +26,16 @@ try:
     move(left=-1,right=-1)
 
     print("Stopping motors...")
-    axis0.controller.input_vel = 0
-    axis1.controller.input_vel = 0
+    motor.set_velocities(0, 0)
 
     print("Returning to idle state...")
-    axis0.requested_state = AXIS_STATE_IDLE
-    axis1.requested_state = AXIS_STATE_IDLE
+    motor.set_state(AXIS_STATE_IDLE)
 
     print("Done!")
 
 except Exception as e:
     print(f"Error: {e}")
     try:
-        axis0.requested_state = AXIS_STATE_IDLE
-        axis1.requested_state = AXIS_STATE_IDLE
+        motor.set_state(AXIS_STATE_IDLE)
     except:
         pass
@@ -0,0 +1,235 @@
+"""Record teleop sessions to a compact binary log and replay them against the simulated motors.
+
+    SESSION_DIR=sessions python cam.py                      # record every run
+    python session.py dump sessions/session-....tlog         # print the records
+    python session.py replay sessions/session-....tlog [--realtime] [--output replayed.tlog]
+
+A log is a header followed by fixed-size records, appended as they happen:
+
+    header:  b'TLOG' | version u16 | meta length u32 | meta JSON
+    record:  kind u8 | wall time f64 | payload
+             CONTROL    x, y, speed       3 x f64
+             SETPOINT   vel0, vel1        2 x f64
+             TELEMETRY  one value per meta['telemetry'] name, f32
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import threading
+import time
+
+from motors import (ControlLoop, SimBackend, TELEMETRY_NAMES, AXIS_STATE_CLOSED_LOOP_CONTROL, mix,
+                    wheel_velocities)
+
+MAGIC = b'TLOG'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+RECORD = struct.Struct('<Bd')
+
+CONTROL = 1
+SETPOINT = 2
+TELEMETRY = 3
+KIND_NAMES = {CONTROL: 'control', SETPOINT: 'setpoint', TELEMETRY: 'telemetry'}
+
+
+def payload_formats(meta):
+    return {
+        CONTROL: struct.Struct('<3d'),
+        SETPOINT: struct.Struct('<2d'),
+        TELEMETRY: struct.Struct(f"<{len(meta['telemetry'])}f"),
+    }
+
+
+class SessionRecorder:
+    """Appends control inputs, wheel setpoints and telemetry rows to a new session log.
+
+    Writes go to a buffered file under a lock, so a record costs the control path a struct pack and
+    a memcpy; a background thread flushes once a second. A crash loses at most that second, and
+    the reader ignores a torn last record.
+    """
+
+    def __init__(self, path, meta, flush_interval=1.0):
+        self.path = path
+        self.meta = dict(meta, telemetry=list(meta.get('telemetry', TELEMETRY_NAMES)), started=time.time())
+        self.formats = payload_formats(self.meta)
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'xb')
+        header = json.dumps(self.meta).encode()
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(header)) + header)
+        self.running = True
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                if not self.file.closed:
+                    self.file.flush()
+
+    def _append(self, kind, timestamp, *values):
+        data = RECORD.pack(kind, timestamp) + self.formats[kind].pack(*values)
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(data)
+            self.records += 1
+
+    def control(self, x, y, speed, timestamp=None):
+        self._append(CONTROL, timestamp or time.time(), x, y, speed)
+
+    def setpoint(self, vel0, vel1, timestamp=None):
+        self._append(SETPOINT, timestamp or time.time(), vel0, vel1)
+
+    def telemetry(self, row):
+        """A TelemetrySampler row: wall time followed by one value per telemetry name"""
+        self._append(TELEMETRY, row[0], *row[1:])
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def read_session(path):
+    """Return (meta, [(kind, wall time, values)]) for a session log"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, meta_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} session log")
+    offset = HEADER.size + meta_length
+    meta = json.loads(data[HEADER.size:offset])
+    formats = payload_formats(meta)
+    records = []
+    while offset + RECORD.size <= len(data):
+        kind, timestamp = RECORD.unpack_from(data, offset)
+        payload = formats.get(kind)
+        if payload is None:
+            raise ValueError(f"{path}: unknown record kind {kind} at byte {offset}")
+        if offset + RECORD.size + payload.size > len(data):
+            break  # torn last record from a crash
+        records.append((kind, timestamp, payload.unpack_from(data, offset + RECORD.size)))
+        offset += RECORD.size + payload.size
+    return meta, records
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def replay(path, realtime=False, latency=0.0, output=None):
+    """Feed a session's control inputs through the control path into a SimBackend.
+
+    The control loop is stepped on a virtual clock, one tick per control period, so a fast replay
+    takes the same decisions as a real-time one; realtime only adds sleeping until each tick is due.
+    Returns a summary dict.
+    """
+    meta, records = read_session(path)
+    if not records:
+        raise ValueError(f"{path} has no records")
+    start = records[0][1]
+    controls = [(timestamp - start, values) for kind, timestamp, values in records if kind == CONTROL]
+    recorded_setpoints = [values for kind, _, values in records if kind == SETPOINT]
+    samples = [(timestamp - start, values) for kind, timestamp, values in records if kind == TELEMETRY]
+    names = meta['telemetry']
+
+    clock = VirtualClock()
+    backend = SimBackend(latency=latency if realtime else 0.0, clock=clock)
+    backend.set_state(AXIS_STATE_CLOSED_LOOP_CONTROL)
+    loop = ControlLoop(backend, rate_hz=meta.get('control_rate_hz', 100), max_accel=meta.get('max_accel', 4.0),
+                       timeout=meta.get('timeout', 0.5))
+    recorder = SessionRecorder(output, dict(meta, replayed_from=path)) if output else None
+
+    setpoints = []
+    vel_errors = []
+    duration = records[-1][1] - start + loop.timeout
+    control_index = sample_index = ticks = 0
+    started = time.monotonic()
+    while True:
+        now = ticks * loop.period
+        if now > duration:
+            break
+        clock.now = now
+        if realtime:
+            delay = started + now - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        while control_index < len(controls) and controls[control_index][0] <= now:
+            x, y, speed = controls[control_index][1]
+            vel = wheel_velocities(*mix(x, y), speed)
+            loop.submit(*vel)
+            setpoints.append(vel)
+            if recorder:
+                recorder.control(x, y, speed, timestamp=start + now)
+                recorder.setpoint(*vel, timestamp=start + now)
+            control_index += 1
+
+        # Step the loop directly instead of start()ing its thread, so it runs on the virtual clock
+        loop.step(now)
+        ticks += 1
+
+        while sample_index < len(samples) and samples[sample_index][0] <= now:
+            recorded = dict(zip(names, samples[sample_index][1]))
+            replayed = backend.read_telemetry()
+            if recorder:
+                recorder.telemetry([start + now] + [replayed[name] for name in names])
+            if 'vel0' in recorded and 'vel1' in recorded:
+                vel_errors.append((replayed['vel0'] - recorded['vel0']) ** 2
+                                  + (replayed['vel1'] - recorded['vel1']) ** 2)
+            sample_index += 1
+
+    if recorder:
+        recorder.close()
+    mismatches = sum(1 for a, b in zip(setpoints, recorded_setpoints)
+                     if not all(math.isclose(p, q, abs_tol=1e-9) for p, q in zip(a, b)))
+    stats = loop.stats()
+    return {
+        'session_s': round(duration, 3),
+        'elapsed_s': round(time.monotonic() - started, 3),
+        'controls': len(controls),
+        'ticks': ticks,
+        'written': stats['written'],
+        'timeouts': stats['timeouts'],
+        'backend_commands': backend.commands,
+        'setpoint_mismatches': mismatches + abs(len(setpoints) - len(recorded_setpoints)),
+        'telemetry_samples': len(samples),
+        # How far the simulated wheels drift from what the robot reported, turns/s
+        'vel_rms_error': round(math.sqrt(sum(vel_errors) / len(vel_errors) / 2), 4) if vel_errors else None,
+    }
+
+
+def dump(path):
+    meta, records = read_session(path)
+    print(json.dumps(meta))
+    start = records[0][1] if records else 0.0
+    for kind, timestamp, values in records:
+        print(f"{timestamp - start:10.3f} {KIND_NAMES[kind]:<9} " + ' '.join(f"{value:.4f}" for value in values))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    dump_parser = commands.add_parser('dump', help="print a session log")
+    dump_parser.add_argument('path')
+    replay_parser = commands.add_parser('replay', help="replay a session against the simulated motors")
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--realtime', action='store_true', help="pace the replay like the original session")
+    replay_parser.add_argument('--latency-ms', type=float, default=0.0, help="simulated ODrive time per command")
+    replay_parser.add_argument('--output', help="record the replayed session here for diffing")
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        dump(args.path)
+    else:
+        print(json.dumps(replay(args.path, args.realtime, args.latency_ms / 1000, args.output), indent=2))
@@ -0,0 +1,244 @@
+const stick = document.getElementById('stick');
+const joystick = document.getElementById('joystick');
+const mobileBtns = document.querySelectorAll('.mobile-btn');
+const speedSlider = document.getElementById('speed-slider');
+const speedValue = document.getElementById('speed-value');
+
+let dragging = false;
+let lastSendTime = 0;
+const THROTTLE_MS = 100;     // POST /control fallback
+const WS_THROTTLE_MS = 20;   // 50 Hz over the WebSocket channel
+let controlSocket = null;
+let controlSeq = 0;
+let currentX = 0;
+let currentY = 0;
+let currentSpeed = 1.0;
+
+// Speed control
+speedSlider.addEventListener('input', function() {
+  currentSpeed = parseFloat(this.value);
+  speedValue.textContent = currentSpeed.toFixed(1) + 'x';
+});
+
+// Status rendering, the server only sends fields that changed so merge into the last known state
+const statusState = {};
+function renderStatus(data) {
+  Object.assign(statusState, data);
+  document.getElementById('battery-percentage').textContent = statusState.battery_percentage + '%';
+  document.getElementById('battery-voltage').textContent = statusState.battery_voltage.toFixed(1) + 'V';
+  document.getElementById('battery-fill').style.width = statusState.battery_percentage + '%';
+  document.getElementById('motor-current').textContent = statusState.motor_current.toFixed(2) + 'A';
+  document.getElementById('motor-temp').textContent = statusState.motor_temp.toFixed(1) + '°C';
+  document.getElementById('uptime').textContent = statusState.uptime + 's';
+}
+
+function updateStatus() {
+  fetch('/status')
+    .then(res => res.json())
+    .then(renderStatus)
+    .catch(err => console.log('Status update failed:', err));
+}
+
+if (window.EventSource) {
+  // Pushed by the server on every telemetry sample, EventSource reconnects on its own
+  const statusEvents = new EventSource('/status/stream');
+  statusEvents.onmessage = e => renderStatus(JSON.parse(e.data));
+} else {
+  // Update status every 2 seconds
+  setInterval(updateStatus, 2000);
+  updateStatus(); // Initial update
+}
+
+// Joystick controls
+joystick.addEventListener('pointerdown', e => {
+  dragging = true;
+  e.preventDefault();
+});
+
+document.addEventListener('pointerup', e => {
+  if (dragging) {
+    dragging = false;
+    resetJoystick();
+    sendJoystick(0, 0);
+  }
+});
+
+document.addEventListener('pointermove', e => {
+  if (!dragging) return;
+  e.preventDefault();
+  
+  const rect = joystick.getBoundingClientRect();
+  let x = e.clientX - rect.left - 110; // Adjusted for smaller joystick
+  let y = e.clientY - rect.top - 110;
+
+  const dist = Math.sqrt(x*x + y*y);
+  const maxDist = 110; // Adjusted for smaller joystick
+  if (dist > maxDist) {
+    x = x * maxDist / dist;
+    y = y * maxDist / dist;
+  }
+
+  stick.style.left = `${x + 110 - 30}px`; // Adjusted positioning
+  stick.style.top = `${y + 110 - 30}px`;
+
+  currentX = x / maxDist;
+  currentY = -y / maxDist;
+  sendJoystick(currentX, currentY);
+});
+
+function resetJoystick() {
+  stick.style.left = '80px'; // Adjusted for smaller joystick
+  stick.style.top = '80px';
+  currentX = 0;
+  currentY = 0;
+}
+
+// Keyboard controls
+const keyMap = {
+  'ArrowUp': [0, 1],
+  'ArrowDown': [0, -1],
+  'ArrowLeft': [-1, 0],
+  'ArrowRight': [1, 0],
+  'KeyW': [0, 1],
+  'KeyS': [0, -1],
+  'KeyA': [-1, 0],
+  'KeyD': [1, 0]
+};
+
+// Track currently pressed keys
+const pressedKeys = new Set();
+
+document.addEventListener('keydown', e => {
+  if (keyMap[e.code]) {
+    e.preventDefault();
+    pressedKeys.add(e.code);
+    updateMovementFromKeys();
+  }
+});
+
+document.addEventListener('keyup', e => {
+  if (keyMap[e.code]) {
+    e.preventDefault();
+    pressedKeys.delete(e.code);
+    updateMovementFromKeys();
+  }
+});
+
+function updateMovementFromKeys() {
+  let x = 0, y = 0;
+  
+  // Calculate combined movement from all pressed keys
+  for (const key of pressedKeys) {
+    const [keyX, keyY] = keyMap[key];
+    x += keyX;
+    y += keyY;
+  }
+  
+  // Normalize diagonal movement to prevent faster diagonal speed
+  if (x !== 0 && y !== 0) {
+    x *= 0.707; // 1/√2
+    y *= 0.707;
+  }
+  
+  // Clamp to [-1, 1] range
+  x = Math.max(-1, Math.min(1, x));
+  y = Math.max(-1, Math.min(1, y));
+  
+  currentX = x;
+  currentY = y;
+  
+  if (pressedKeys.size === 0) {
+    // No keys pressed, reset joystick
+    resetJoystick();
+    sendJoystick(0, 0);
+  } else {
+    // Update joystick visual and send movement
+    updateJoystickVisual(x, y);
+    sendJoystick(x, y);
+  }
+}
+
+function updateJoystickVisual(x, y) {
+  const maxDist = 110; // Adjusted for smaller joystick
+  const visualX = x * maxDist;
+  const visualY = -y * maxDist;
+  stick.style.left = `${visualX + 110 - 30}px`; // Adjusted positioning
+  stick.style.top = `${visualY + 110 - 30}px`;
+}
+
+// Mobile button controls
+mobileBtns.forEach(btn => {
+  btn.addEventListener('touchstart', e => {
+    e.preventDefault();
+    const action = btn.dataset.action;
+    let x = 0, y = 0;
+    
+    switch(action) {
+      case 'forward': y = 1; break;
+      case 'backward': y = -1; break;
+      case 'left': x = -1; break;
+      case 'right': x = 1; break;
+      case 'stop': x = 0; y = 0; break;
+    }
+    
+    currentX = x;
+    currentY = y;
+    updateJoystickVisual(x, y);
+    sendJoystick(x, y);
+  });
+  
+  btn.addEventListener('touchend', e => {
+    e.preventDefault();
+    resetJoystick();
+    sendJoystick(0, 0);
+  });
+});
+
+// Persistent control channel, reconnects on drop and falls back to POST while down
+function connectControl() {
+  const proto = location.protocol === 'https:' ? 'wss://' : 'ws://';
+  const ws = new WebSocket(proto + location.host + '/control_ws');
+  ws.onopen = () => { controlSocket = ws; };
+  ws.onclose = () => {
+    controlSocket = null;
+    setTimeout(connectControl, 1000);
+  };
+}
+connectControl();
+
+// Keep re-sending held input so the server's command timeout only fires when the page is gone
+setInterval(() => {
+  if (currentX !== 0 || currentY !== 0) sendJoystick(currentX, currentY);
+}, 150);
+
+function sendJoystick(x, y) {
+  const now = Date.now();
+  const wsOpen = controlSocket && controlSocket.readyState === WebSocket.OPEN;
+  // Bypass throttling for stop signals (x=0, y=0)
+  if (x === 0 && y === 0) {
+    lastSendTime = now;
+  } else if (now - lastSendTime < (wsOpen ? WS_THROTTLE_MS : THROTTLE_MS)) {
+    return; // Skip if not enough time has passed
+  } else {
+    lastSendTime = now;
+  }
+
+  if (wsOpen) {
+    controlSocket.send(JSON.stringify([controlSeq++, x, y, currentSpeed]));
+    return;
+  }
+  
+  fetch('/control', {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({x, y, speed: currentSpeed})
+  })
+  .then(res => res.json())
+  .then(data => {
+    console.log("Wheel output:", data);
+  })
+  .catch(err => console.log('Control failed:', err));
+}
+
+// Prevent context menu on long press
+document.addEventListener('contextmenu', e => e.preventDefault());
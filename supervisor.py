@@ -0,0 +1,84 @@
+import threading
+
+
+class Supervisor:
+    """Keeps a device connected from a background thread, retrying with exponential backoff.
+
+    connect() returns the device or raises. Users report trouble with failed(); after max_errors
+    failures without an ok() in between the device is dropped through on_disconnect and reconnected.
+    """
+
+    def __init__(self, name, connect, on_connect=None, on_disconnect=None,
+                 max_errors=3, min_delay=0.5, max_delay=10.0):
+        self.name = name
+        self.connect = connect
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.max_errors = max_errors
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.device = None
+        self.state = 'connecting'
+        self.attempts = 0
+        self.errors = 0
+        self.last_error = None
+        self.lost = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.lost.set()
+
+    def _run(self):
+        delay = self.min_delay
+        while self.running:
+            self.state = 'connecting'
+            self.attempts += 1
+            try:
+                device = self.connect()
+            except Exception as e:
+                self.last_error = str(e)
+                self.state = 'disconnected'
+                print(f"{self.name} connect failed ({e}), retrying in {delay:.1f}s")
+                self.lost.wait(delay)
+                delay = min(delay * 2, self.max_delay)
+                continue
+
+            self.device = device
+            self.errors = 0
+            self.last_error = None
+            self.lost.clear()
+            if self.on_connect:
+                self.on_connect(device)
+            self.state = 'connected'
+            print(f"{self.name} connected")
+            delay = self.min_delay
+
+            self.lost.wait()
+            self.state = 'disconnected'
+            self.device = None
+            if self.on_disconnect:
+                try:
+                    self.on_disconnect(device)
+                except Exception as e:
+                    print(f"{self.name} disconnect cleanup failed: {e}")
+            if self.running:
+                print(f"{self.name} lost ({self.last_error}), reconnecting")
+
+    def ok(self):
+        self.errors = 0
+
+    def failed(self, error):
+        self.errors += 1
+        self.last_error = str(error)
+        if self.errors >= self.max_errors:
+            self.lost.set()
+
+    def status(self):
+        return {'state': self.state, 'attempts': self.attempts, 'error': self.last_error}
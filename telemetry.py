@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+SAMPLE_TIME = metrics.histogram('telemetry_sample_seconds', 'Time for one telemetry read from the motor backend')
+
+
+class TelemetrySampler:
+    """Samples named channels at a fixed rate into a fixed-size ring buffer"""
+
+    def __init__(self, read, names, rate_hz=20, history_seconds=600):
+        # read: zero-argument callable returning {name: float} for every name in names,
+        # or None while the source is disconnected
+        self.read = read
+        self.on_error = None
+        self.on_ok = None
+        self.on_sample = None  # called with each new row, e.g. to record the session
+        self.names = ['time'] + list(names)
+        self.period = 1.0 / rate_hz
+        self.capacity = max(1, int(rate_hz * history_seconds))
+        self.buffer = np.zeros((self.capacity, len(self.names)), dtype=np.float64)
+        self.count = 0  # total samples written, the ring index is count % capacity
+        self.errors = 0
+        self.last_duration = 0.0
+        self.lock = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.running:
+            self.sample()
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def sample(self):
+        read = self.read
+        if read is None:
+            return
+        started = time.monotonic()
+        try:
+            values = read()
+            row = [time.time()] + [float(values[name]) for name in self.names[1:]]
+        except Exception as e:
+            self.errors += 1
+            print(f"Error reading telemetry: {e}")
+            if self.on_error:
+                self.on_error(e)
+            return
+        if self.on_ok:
+            self.on_ok()
+        self.last_duration = time.monotonic() - started
+        SAMPLE_TIME.observe(self.last_duration)
+        with self.lock:
+            self.buffer[self.count % self.capacity] = row
+            self.count += 1
+            self.lock.notify_all()
+        if self.on_sample:
+            self.on_sample(row)
+
+    def wait(self, last_count, timeout=1.0):
+        """Block until a sample newer than last_count arrives (or timeout) and return the sample count"""
+        with self.lock:
+            self.lock.wait_for(lambda: self.count != last_count, timeout)
+            return self.count
+
+    def snapshot(self):
+        """Latest complete sample as a dict, or None before the first sample"""
+        with self.lock:
+            if self.count == 0:
+                return None
+            row = self.buffer[(self.count - 1) % self.capacity].copy()
+        return dict(zip(self.names, row.tolist()))
+
+    def _window(self, since):
+        """Copy out samples newer than since, oldest first"""
+        with self.lock:
+            n = min(self.count, self.capacity)
+            start = self.count % self.capacity if self.count > self.capacity else 0
+            data = np.roll(self.buffer[:n], -start, axis=0) if start else self.buffer[:n].copy()
+        return data[data[:, 0] >= since]
+
+    def history(self, seconds=60, points=200):
+        """Downsample the last seconds of samples into at most points buckets of min/max/mean per channel"""
+        data = self._window(time.time() - seconds)
+        result = {'time': [], 'count': len(data)}
+        for name in self.names[1:]:
+            result[name] = {'min': [], 'max': [], 'mean': []}
+        if len(data) == 0:
+            return result
+
+        for bucket in np.array_split(data, min(points, len(data))):
+            result['time'].append(float(bucket[0, 0]))
+            for i, name in enumerate(self.names[1:], start=1):
+                column = bucket[:, i]
+                result[name]['min'].append(float(column.min()))
+                result[name]['max'].append(float(column.max()))
+                result[name]['mean'].append(float(column.mean()))
+        return result
+
+
+def select_payload(last_seq, seq, full, delta):
+    """Pick what a status client needs to go from last_seq to seq.
+
+    A client that kept up gets only the changed fields; a new client, or one that missed a tick
+    so deltas no longer line up, gets the full state. None if there's nothing new.
+    """
+    if seq == last_seq or full is None:
+        return None
+    if last_seq is not None and seq == last_seq + 1:
+        return delta
+    return full
+
+
+class StatusStream:
+    """Serializes one status payload per telemetry sample and shares it with every subscriber as SSE"""
+
+    def __init__(self, build, sampler=None, idle_period=1.0):
+        self.build = build  # zero-argument callable returning the status dict
+        self.sampler = sampler
+        self.idle_period = idle_period  # republish cadence when there's no sampler to wait on
+        self.state = {}
+        self.full = None
+        self.delta = None
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def _run(self):
+        last_count = -1
+        while self.running:
+            if self.sampler:
+                last_count = self.sampler.wait(last_count, timeout=self.idle_period)
+            else:
+                time.sleep(self.idle_period)
+            try:
+                status = self.build()
+            except Exception as e:
+                print(f"Error building status: {e}")
+                continue
+            delta = {key: value for key, value in status.items() if self.state.get(key) != value}
+            if not delta:
+                continue
+            with self.cond:
+                self.state = status
+                self.full = self._event(status)
+                self.delta = self._event(delta)
+                self.seq += 1
+                self.cond.notify_all()
+
+    def _event(self, data):
+        return f"data: {json.dumps(data)}\n\n".encode()
+
+    def wait_all(self, last_seq, timeout=1.0):
+        """Block until a payload newer than last_seq exists and return (seq, (full, delta))"""
+        with self.cond:
+            self.cond.wait_for(lambda: (self.seq != last_seq and self.full is not None) or not self.running, timeout)
+            return self.seq, (self.full, self.delta)
+
+    def wait(self, last_seq, timeout=15):
+        """Block until a payload newer than last_seq exists and return (seq, payload) for that client.
+
+        payload is None on timeout.
+        """
+        seq, (full, delta) = self.wait_all(last_seq, timeout)
+        return seq, select_payload(last_seq, seq, full, delta)
+
+    def events(self):
+        """Yield SSE payloads for one client: the full state first, then only changed fields"""
+        seq = None
+        while self.running:
+            seq, payload = self.wait(seq)
+            yield payload if payload is not None else b": keepalive\n\n"
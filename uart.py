@@ -1,71 +1,187 @@
 import serial
 import time
-import os
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 
 # UART configuration for direct serial communication
 UART_PORT = "/dev/ttyACM0"  # USB connection (working port)
 BAUDRATE = 115200
 
-def send_ascii_command(ser, command, delay=0.1):
-    """Send ASCII command and return response"""
-    ser.write((command + '\n').encode())
-    if delay: time.sleep(delay)  
-    response = ser.readline().decode().strip()
-    return response
-
-try:
-    print(f"Connecting to ODrive over UART on {UART_PORT}...")
-    
-    # Open serial connection
-    ser = serial.Serial(
-        port=UART_PORT,
-        baudrate=BAUDRATE,
-        timeout=1,
-        bytesize=serial.EIGHTBITS,
-        parity=serial.PARITY_NONE,
-        stopbits=serial.STOPBITS_ONE
-    )
-    
-    print("Connected successfully!")
-    
-    # Test connection
-    response = send_ascii_command(ser, "r vbus_voltage")
-    print(f"Bus voltage: {response}")
-
-    print("\nStarting sensorless control...")
-    send_ascii_command(ser, "w axis0.requested_state 5")
-    send_ascii_command(ser, "w axis1.requested_state 5")
-    
-    time.sleep(1)
-    
-    speed = 0.00001
-    print(f"Setting velocity to {speed}")
-    send_ascii_command(ser, f"v 0 {speed}", 0)
-    send_ascii_command(ser, f"v 1 {speed}", 0)
-    
-    time.sleep(2)
-    
-    print("Stopping motors...")
-    
-    # Stop both axes with batched commands
-    send_ascii_command(ser, f"v 0 0", 0)
-    send_ascii_command(ser, f"v 1 0", 0)
-    
-    
-    send_ascii_command(ser, "w axis0.requested_state 1")  # 1 = AXIS_STATE_IDLE
-    send_ascii_command(ser, "w axis1.requested_state 1")  # 1 = AXIS_STATE_IDLE
-
-    print("Done!")
-    
-    # Close serial connection
-    ser.close()
-
-except Exception as e:
-    print(f"Error: {e}")
-    print(f"Make sure the ODrive is connected to {UART_PORT} and the port is available.")
-    print("You may need to run with sudo if you don't have permission to access ttyS2")
+
+class OdriveUart:
+    """Pipelined ODrive ASCII protocol transport.
+
+    Commands are written without waiting for earlier replies. A reader thread hands each reply line
+    to the oldest outstanding request, which works because the ODrive answers strictly in order.
+    `v` and `w` commands get no reply from a healthy ODrive and are sent fire-and-forget, so an
+    invalid property name in a `w` would put the reply matching out of step. A reply that doesn't
+    arrive within timeout resyncs the transport: every outstanding request fails and the input is
+    flushed, so the next request pairs with its own reply again.
+    """
+
+    def __init__(self, ser, timeout=1.0):
+        self.ser = ser
+        self.timeout = timeout
+        self.pending = deque()
+        self.lock = threading.Lock()  # guards pending and generation
+        self.generation = 0  # bumped by every resync, tells the reader to drop its partial line
+        self.resyncs = 0
+        self.write_lock = threading.Lock()
+        self.running = True
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    @classmethod
+    def open(cls, port=UART_PORT, baudrate=BAUDRATE, timeout=1.0):
+        ser = serial.Serial(
+            port=port,
+            baudrate=baudrate,
+            timeout=0.1,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE
+        )
+        return cls(ser, timeout=timeout)
+
+    def close(self):
+        self.running = False
+        self.reader.join(1.0)
+        self.ser.close()
+        with self.lock:
+            pending, self.pending = self.pending, deque()
+        for future in pending:
+            future.set_exception(ConnectionError("UART closed"))
+
+    def _read_loop(self):
+        buffer = b''
+        generation = self.generation
+        while self.running:
+            try:
+                # readline() would hand back half a line whenever the serial timeout expires mid-reply,
+                # so collect bytes and only split off complete lines
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                print(f"UART read failed: {e}")
+                break
+            if not data:
+                continue
+            with self.lock:
+                if generation != self.generation:
+                    buffer, generation = b'', self.generation
+                *lines, buffer = (buffer + data).split(b'\n')
+                for line in lines:
+                    line = line.decode(errors='replace').strip()
+                    if not line:
+                        continue
+                    if not self.pending:
+                        print(f"Unexpected UART reply: {line!r}")
+                        continue
+                    self.pending.popleft().set_result(line)
+
+    def _write(self, commands, replies):
+        """Write commands in one go, registering a future for each one that expects a reply"""
+        futures = [Future() for _ in range(replies)]
+        with self.write_lock:
+            # Register before writing so a fast reply can't beat its future into the queue
+            with self.lock:
+                self.pending.extend(futures)
+            self.ser.write(''.join(command + '\n' for command in commands).encode())
+        return futures
+
+    def _resync(self):
+        """Fail every outstanding request and flush the input, so later replies line up with their requests"""
+        with self.write_lock, self.lock:
+            pending, self.pending = self.pending, deque()
+            self.generation += 1
+            self.resyncs += 1
+            self.ser.reset_input_buffer()
+        print(f"UART reply timed out, dropped {len(pending)} outstanding request(s) to resync")
+        for future in pending:
+            future.set_exception(FutureTimeout("UART reply lost, request dropped while resyncing"))
+
+    def result(self, future):
+        """Wait for a request's reply, resyncing the transport if it doesn't arrive within timeout"""
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # Another waiter's resync may already have failed this future; only resync if it's still pending
+            if not future.done():
+                self._resync()
+            raise
+
+    def send(self, *commands):
+        """Fire-and-forget commands that produce no reply (v, w, ...)"""
+        self._write(commands, 0)
+
+    def request(self, command):
+        """Send a command that produces a reply and return a Future for it"""
+        return self._write([command], 1)[0]
+
+    def query(self, command):
+        return self.result(self.request(command))
+
+    def read(self, *props):
+        """Read several properties with a single write; returns their values as floats"""
+        futures = self._write([f"r {prop}" for prop in props], len(props))
+        return [float(self.result(future)) for future in futures]
+
+    def write(self, prop, value):
+        self.send(f"w {prop} {value}")
+
+    def set_state(self, axis, state):
+        self.send(f"w axis{axis}.requested_state {state}")
+
+    def set_velocities(self, vel0, vel1):
+        """Set both axis velocities in one write"""
+        self.send(f"v 0 {vel0}", f"v 1 {vel1}")
+
+    def feedback(self, axis):
+        """Position and velocity estimate of one axis"""
+        pos, vel = self.query(f"f {axis}").split()
+        return float(pos), float(vel)
+
+
+if __name__ == "__main__":
+    odrv = None
     try:
-        if 'ser' in locals():
-            ser.close()
-    except:
-        pass
+        print(f"Connecting to ODrive over UART on {UART_PORT}...")
+        odrv = OdriveUart.open(UART_PORT, BAUDRATE)
+        print("Connected successfully!")
+
+        # Test connection
+        vbus, = odrv.read("vbus_voltage")
+        print(f"Bus voltage: {vbus}")
+
+        print("\nStarting sensorless control...")
+        odrv.set_state(0, 5)
+        odrv.set_state(1, 5)
+
+        time.sleep(1)
+
+        speed = 0.00001
+        print(f"Setting velocity to {speed}")
+        odrv.set_velocities(speed, speed)
+
+        time.sleep(2)
+
+        print("Stopping motors...")
+        odrv.set_velocities(0, 0)
+
+        odrv.set_state(0, 1)  # 1 = AXIS_STATE_IDLE
+        odrv.set_state(1, 1)  # 1 = AXIS_STATE_IDLE
+
+        # Round-trip a read so the idle commands are on the wire before closing
+        odrv.read("vbus_voltage")
+        print("Done!")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print(f"Make sure the ODrive is connected to {UART_PORT} and the port is available.")
+        print("You may need to run with sudo if you don't have permission to access ttyS2")
+    finally:
+        if odrv:
+            try:
+                odrv.close()
+            except:
+                pass
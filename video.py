@@ -0,0 +1,665 @@
+import atexit
+import multiprocessing
+import signal
+import socket
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import metrics
+from supervisor import Supervisor
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None
+
+JPEG_SOI = b'\xff\xd8'
+
+# Per-client quality ladder, best first: (JPEG quality, scale, max fps). Rung 0 is the hub's own frame.
+LADDER = (
+    (None, 1.0, None),
+    (60, 1.0, 15),
+    (50, 0.5, 10),
+    (40, 0.5, 5),
+    (30, 0.25, 2),
+)
+
+# Reduced-size JPEG decodes are much cheaper than a full decode followed by a resize
+REDUCED_DECODE = {1.0: cv2.IMREAD_COLOR, 0.5: cv2.IMREAD_REDUCED_COLOR_2, 0.25: cv2.IMREAD_REDUCED_COLOR_4}
+
+# Send buffer for streaming sockets. The kernel otherwise grows it to megabytes for a slow client and
+# fills it with frames that are long stale by the time they arrive. Linux doubles the value set.
+STREAM_SEND_BUFFER = 64 * 1024
+
+# Size of the grayscale thumbnail the change detector compares
+THUMBNAIL_SIZE = (32, 24)
+
+CAMERA_READ = metrics.histogram('camera_read_seconds', 'Time blocked in camera.read(), including waiting for the frame')
+FRAMES_SKIPPED = metrics.counter('video_frames_skipped_total', 'Captured frames dropped because the scene was static')
+
+
+def is_jpeg(data):
+    return len(data) > 2 and bytes(data[:2]) == JPEG_SOI
+
+
+def enable_mjpeg_passthrough(camera):
+    """Ask the camera for MJPG and return True if read() now hands back the camera's own JPEG bytes"""
+    camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    if int(camera.get(cv2.CAP_PROP_FOURCC)) != cv2.VideoWriter_fourcc(*'MJPG'):
+        return False
+
+    # With RGB conversion off, V4L2 returns the undecoded compressed buffer
+    if not camera.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+        return False
+    success, data = camera.read()
+    if success and data is not None and data.ndim <= 2 and is_jpeg(data.reshape(-1)):
+        return True
+
+    camera.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+    return False
+
+
+class SyntheticCamera:
+    """cv2.VideoCapture stand-in that paces a scrolling test pattern at fps, for benchmarks without a camera"""
+
+    def __init__(self, width=640, height=480, fps=15):
+        self.width = width
+        self.period = 1.0 / fps
+        self.next_frame = time.monotonic()
+        self.count = 0
+        # Twice as wide as a frame so every frame is a different window and change detection sees motion
+        x = np.linspace(0, 8 * np.pi, 2 * width)
+        y = np.linspace(0, 6 * np.pi, height)[:, None]
+        gray = (127 + 60 * np.sin(x) + 60 * np.cos(y)).astype(np.uint8)
+        noise = np.random.default_rng(0).integers(0, 16, gray.shape, dtype=np.uint8)
+        self.pattern = cv2.cvtColor(gray + noise, cv2.COLOR_GRAY2BGR)
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        delay = self.next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame = max(self.next_frame + self.period, time.monotonic())
+        offset = self.count * 8 % self.width
+        self.count += 1
+        window = self.pattern[:, offset:offset + self.width]
+        if image is None or image.shape != window.shape:
+            image = np.empty_like(window)
+        np.copyto(image, window)
+        cv2.putText(image, str(self.count), (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        return True, image
+
+    def release(self):
+        pass
+
+
+def open_camera(index=0, width=640, height=480, fps=15, mjpeg=True, source='device'):
+    """Open and configure a camera; returns (camera, mjpeg_passthrough)"""
+    if source == 'synthetic':
+        return SyntheticCamera(width, height, fps), False
+
+    camera = cv2.VideoCapture(index)
+    if not camera.isOpened():
+        raise IOError(f"can't open camera {index}")
+
+    # MJPG has to be requested before the frame size for most UVC drivers
+    passthrough = mjpeg and enable_mjpeg_passthrough(camera)
+
+    # Set camera properties for better performance
+    camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    camera.set(cv2.CAP_PROP_FPS, fps)
+    print(f"Camera MJPEG passthrough: {'on' if passthrough else 'off'}")
+    return camera, passthrough
+
+
+def supervise_camera(hub, camera_args):
+    """Open the camera in the background and reopen it whenever the hub reports a read failure"""
+    supervisor = Supervisor(
+        "Camera",
+        lambda: open_camera(**camera_args),
+        on_connect=lambda device: hub.set_camera(*device),
+        on_disconnect=lambda device: device[0].release(),
+        max_errors=1,
+    )
+    hub.on_failure = supervisor.failed
+    supervisor.start()
+    return supervisor
+
+
+def socket_backlog(sock, send_buffer=STREAM_SEND_BUFFER):
+    """Cap a streaming socket's send buffer and return a callable giving the bytes it hasn't delivered yet.
+
+    Returns None where the queue can't be read, viewers then fall back to timing their writes.
+    """
+    if sock is None or fcntl is None:
+        return None
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer)
+    except OSError:
+        return None
+
+    def backlog():
+        # TIOCOUTQ on a TCP socket is SIOCOUTQ: bytes written but not yet acknowledged by the client
+        try:
+            return struct.unpack('i', fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b'\0\0\0\0'))[0]
+        except (OSError, ValueError):
+            return None
+    return backlog
+
+
+def multipart_header(length, boundary=b'frame', first=False):
+    """Part header for one JPEG in a multipart/x-mixed-replace body, closing the previous part unless first"""
+    separator = b'' if first else b'\r\n'
+    return separator + b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % (boundary, length)
+
+
+def multipart_chunks(frames, boundary=b'frame'):
+    """Multipart/x-mixed-replace body with headers and payload as separate chunks.
+
+    The shared frame bytes go out as-is instead of being concatenated into a new per-client buffer.
+    """
+    first = True
+    for frame in frames:
+        yield multipart_header(len(frame), boundary, first)
+        yield frame
+        first = False
+
+
+def thumbnail(image, passthrough=False):
+    """Tiny grayscale copy of a frame for cheap change detection"""
+    if passthrough:
+        # 1/8 scale grayscale decode only touches the DCT DC terms, far cheaper than a full decode
+        image = cv2.imdecode(image, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if image is None:
+            return None
+    else:
+        # Every 4th pixel is plenty for a 32x24 average and halves the resize cost
+        image = cv2.resize(image[::4, ::4], THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class FrameHub:
+    """Reads and JPEG-encodes each camera frame once and fans it out to every viewer"""
+
+    def __init__(self, camera=None, passthrough=False, ring_size=3, quality=80, ladder=LADDER,
+                 change_threshold=0.0, keepalive=1.0, stream='video'):
+        # camera can arrive later through set_camera(), capture waits until it does
+        self.camera = camera
+        self.passthrough = passthrough
+        # Called with the error when a read fails; without it a failed read stops the hub for good
+        self.on_failure = None
+        self.quality = quality
+        self.ladder = ladder
+        # Frames whose thumbnail differs from the last published one by less than this mean
+        # gray level are dropped before encoding, except for one keepalive frame every keepalive seconds
+        self.change_threshold = change_threshold
+        self.keepalive = keepalive
+        self.last_thumbnail = None
+        self.skipped = 0
+        # Capture buffers are reused round-robin so read() doesn't allocate a new image every frame
+        self.images = [None] * ring_size
+        self.ring_index = 0
+        self.frame = None
+        self.image = None
+        self.seq = 0
+        self.frame_interval = 1 / 15  # running estimate of the capture period
+        self.published = None
+        # Lower-rung encodes of the current frame, made on first request and shared by every client on that rung
+        self.variants = {}
+        self.variant_locks = [threading.Lock() for _ in ladder]
+        self.encode_time = [metrics.histogram('video_encode_seconds', 'JPEG encode time, rung 0 is the shared frame',
+                                              rung=str(rung)) for rung in range(len(ladder))]
+        # Client traffic, labelled by stream so vision overlays don't count as camera video
+        self.sent_bytes = metrics.counter('video_sent_bytes_total', 'JPEG bytes written to stream clients',
+                                          stream=stream)
+        self.send_time = metrics.histogram('video_send_seconds', 'Time to write one frame to one client',
+                                           stream=stream)
+        self.backlog_skipped = metrics.counter(
+            'video_backlog_skipped_total', 'Frames not sent to a client because its socket still held the previous ones',
+            stream=stream)
+        self.client_bytes = metrics.histogram('video_client_bytes', 'Bytes sent to one client over its connection',
+                                              buckets=metrics.SIZE_BUCKETS, stream=stream)
+        self.viewers = 0
+        self.internal = 0  # subscribers that aren't clients, like the recorder and the vision stage
+        self.running = False
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def set_camera(self, camera, passthrough=False):
+        with self.cond:
+            self.camera = camera
+            self.passthrough = passthrough
+            self.last_thumbnail = None
+            self.cond.notify_all()
+
+    def _capture_loop(self):
+        while self.running:
+            # Don't burn CPU on capture and encode while nobody is watching
+            with self.cond:
+                while self.running and (self.viewers == 0 or self.camera is None):
+                    self.cond.wait()
+                camera = self.camera
+            if not self.running:
+                break
+
+            slot = self.ring_index % len(self.images)
+            started = time.perf_counter()
+            success, image = camera.read(self.images[slot])
+            CAMERA_READ.observe(time.perf_counter() - started)
+            if not success:
+                if not self.on_failure:
+                    print("Camera read failed, stopping capture")
+                    self.stop()
+                    break
+                print("Camera read failed, waiting for reconnect")
+                with self.cond:
+                    if self.camera is camera:
+                        self.camera = None
+                self.on_failure(IOError("camera read failed"))
+                continue
+            self.images[slot] = image
+            # The ring only moves on when a frame is published. A dropped frame's slot is read into again,
+            # so capture never overwrites the published image that variant() may be encoding.
+
+            if self.change_threshold and self._unchanged(image):
+                self.skipped += 1
+                FRAMES_SKIPPED.inc()
+                continue
+
+            if self.passthrough:
+                # Camera already delivered a JPEG, skip decode and re-encode
+                data = image.reshape(-1)
+                if is_jpeg(data):
+                    self.ring_index += 1
+                    self.publish(data.tobytes(), data)
+                continue
+
+            started = time.perf_counter()
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            self.encode_time[0].observe(time.perf_counter() - started)
+            if ret:
+                # The one copy per frame, every viewer shares the resulting bytes
+                self.ring_index += 1
+                self.publish(buffer.tobytes(), image)
+
+    def _unchanged(self, image):
+        """True if the scene hasn't moved since the last published frame and no keepalive is due"""
+        small = thumbnail(image, self.passthrough)
+        if small is None:
+            return False
+        if (self.last_thumbnail is not None and self.published
+                and time.monotonic() - self.published < self.keepalive
+                and cv2.norm(small, self.last_thumbnail, cv2.NORM_L1) / small.size < self.change_threshold):
+            return True
+        self.last_thumbnail = small
+        return False
+
+    def publish(self, frame, image=None):
+        now = time.monotonic()
+        with self.cond:
+            if self.published:
+                self.frame_interval += 0.1 * (now - self.published - self.frame_interval)
+            self.published = now
+            self.frame = frame
+            self.image = image
+            self.variants = {}
+            self.seq += 1
+            self.cond.notify_all()
+
+    def variant(self, rung):
+        """Return (seq, frame) of the current frame encoded for a ladder rung, encoding it at most once"""
+        with self.cond:
+            seq, image = self.seq, self.image
+            if rung == 0 or image is None:
+                return seq, self.frame
+            if rung in self.variants:
+                return seq, self.variants[rung]
+
+        with self.variant_locks[rung]:
+            # Another client on this rung may have encoded it while we waited for the lock
+            with self.cond:
+                if self.seq == seq and rung in self.variants:
+                    return seq, self.variants[rung]
+            started = time.perf_counter()
+            frame = self._encode_variant(image, *self.ladder[rung][:2])
+            self.encode_time[rung].observe(time.perf_counter() - started)
+            with self.cond:
+                if self.seq == seq:
+                    self.variants[rung] = frame
+        return seq, frame
+
+    def _encode_variant(self, image, quality, scale):
+        if self.passthrough:
+            flag = REDUCED_DECODE.get(scale)
+            image = cv2.imdecode(image, flag if flag is not None else cv2.IMREAD_COLOR)
+            if flag is None:
+                image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        elif scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer.tobytes() if ret else None
+
+    def wait(self, last_seq, timeout=1.0):
+        """Block until a frame newer than last_seq exists and return (seq, frame).
+
+        Readers always get the newest frame, so a slow client skips frames instead of queueing them.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq or not self.running, timeout)
+            return self.seq, self.frame
+
+    def subscribe(self, internal=False):
+        """Count a viewer in; capture only runs while there's at least one.
+
+        internal marks a consumer inside the server, which keeps capture running but isn't a client.
+        """
+        with self.cond:
+            self.viewers += 1
+            self.internal += internal
+            self.cond.notify_all()
+
+    def unsubscribe(self, internal=False):
+        with self.cond:
+            self.viewers -= 1
+            self.internal -= internal
+
+    @property
+    def clients(self):
+        return self.viewers - self.internal
+
+    def frames(self, adaptive=True, backlog=None):
+        """Yield encoded JPEG frames for one viewer until capture stops.
+
+        backlog is the viewer's socket_backlog(); while the socket still holds most of the last frame,
+        newer frames are skipped instead of being queued behind it. With adaptive on, the viewer also
+        moves along the ladder to fit its link.
+        """
+        self.subscribe()
+        viewer = LadderViewer(self, adaptive, backlog)
+        total = 0
+        try:
+            seq = self.seq
+            while self.running:
+                new_seq, frame = self.wait(seq)
+                if new_seq == seq or frame is None:
+                    continue
+                seq = new_seq
+                if not viewer.due():
+                    continue
+                if viewer.rung:
+                    seq, frame = self.variant(viewer.rung)
+                    if frame is None:
+                        continue
+
+                sent = time.monotonic()
+                yield frame
+                send_time = time.monotonic() - sent
+                self.send_time.observe(send_time)
+                self.sent_bytes.inc(len(frame))
+                total += len(frame)
+                viewer.sent(send_time, len(frame))
+        finally:
+            self.client_bytes.observe(total)
+            self.unsubscribe()
+
+
+class LadderViewer:
+    """One client's position on the hub's quality ladder"""
+
+    def __init__(self, hub, adaptive=True, backlog=None):
+        self.hub = hub
+        self.adaptive = adaptive
+        self.backlog = backlog
+        self.rung = 0
+        self.slow = 0
+        self.fast = 0
+        self.last_sent = 0.0
+        self.last_size = 0
+        self.queued = None  # bytes still on the socket when the current frame was let through
+        self.backed_up = False  # a frame was skipped for backlog since the last one went out
+
+    def max_fps(self):
+        return self.hub.ladder[self.rung][2]
+
+    def due(self):
+        """False if sending now would exceed the current rung's frame rate or queue behind an undelivered frame"""
+        max_fps = self.max_fps()
+        if max_fps and time.monotonic() - self.last_sent < 1 / max_fps:
+            return False
+        self.queued = self.backlog() if self.backlog else None
+        if self.queued is not None and self.queued > self.last_size // 2:
+            self.hub.backlog_skipped.inc()
+            self.backed_up = True
+            return False
+        return True
+
+    def sent(self, send_time, size=0):
+        """Record how long the last frame took to go out and move rungs if needed"""
+        self.last_sent = time.monotonic() - send_time
+        self.last_size = size
+        backed_up, self.backed_up = self.backed_up, False
+        if not self.adaptive:
+            return
+        max_fps = self.max_fps()
+        budget = max(self.hub.frame_interval, 1 / max_fps if max_fps else 0)
+        if self.queued is not None:
+            # The write returns once the kernel has the bytes, so judge the link by what is still queued:
+            # slow if frames had to be skipped waiting for the socket, fast if it was all but empty
+            slow = backed_up
+            fast = not backed_up and self.queued < size // 4
+        else:
+            # No queue to read, fall back to how long the write blocked
+            slow = send_time > 0.8 * budget
+            fast = send_time < 0.3 * budget
+        # Step down after a few slow frames, step back up only after a good couple of seconds of fast ones
+        if slow:
+            self.slow, self.fast = self.slow + 1, 0
+        elif fast:
+            self.slow, self.fast = 0, self.fast + 1
+        else:
+            self.slow = self.fast = 0
+        if self.slow >= 3 and self.rung < len(self.hub.ladder) - 1:
+            self.rung += 1
+            self.slow = 0
+        elif self.fast >= 30 and self.rung > 0:
+            self.rung -= 1
+            self.fast = 0
+
+
+class SharedFrameRing:
+    """Encoded frames in fixed shared-memory slots, each tagged with its sequence number.
+
+    One writer, any number of readers. The writer zeroes a slot's sequence number before
+    overwriting it and sets it again afterwards, so a reader that sees the same number before
+    and after its copy knows the copy isn't torn.
+    """
+
+    def __init__(self, slots=4, slot_size=1 << 20):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=8 + slots * 16 + slots * slot_size)
+        buf = self.shm.buf
+        self.latest = np.ndarray((1,), np.uint64, buf, 0)
+        self.meta = np.ndarray((slots, 2), np.uint64, buf, 8)  # per slot: seq, length
+        self.data = np.ndarray((slots, slot_size), np.uint8, buf, 8 + slots * 16)
+        self.latest[0] = 0
+        self.meta[:] = 0
+        self.dropped = 0
+
+    def close(self):
+        del self.latest, self.meta, self.data
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def write(self, frame):
+        if len(frame) > self.slot_size:
+            self.dropped += 1
+            return False
+        seq = int(self.latest[0]) + 1
+        slot = seq % self.slots
+        self.meta[slot, 0] = 0
+        self.data[slot, :len(frame)] = np.frombuffer(frame, np.uint8)
+        self.meta[slot, 1] = len(frame)
+        self.meta[slot, 0] = seq
+        self.latest[0] = seq
+        return True
+
+    def read(self, last_seq):
+        """Return (seq, copy of the newest frame) or (last_seq, None) if nothing newer is readable"""
+        seq = int(self.latest[0])
+        if seq == last_seq or seq == 0:
+            return last_seq, None
+        slot = seq % self.slots
+        length = int(self.meta[slot, 1])
+        frame = self.data[slot, :length].copy()
+        if int(self.meta[slot, 0]) != seq:
+            return last_seq, None  # overwritten while copying
+        return seq, frame
+
+
+CAMERA_STATES = ('connecting', 'connected', 'disconnected')
+
+
+def _capture_worker(ring, new_frame, demand, camera_state, camera_args, hub_args):
+    """Worker process body: capture and encode with a FrameHub and publish into the shared ring"""
+    # Shutdown is the parent's job; it terminates this process on exit. A respawned worker is forked
+    # after the parent installed its own handlers, which must not run here.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    hub = FrameHub(**hub_args)
+    hub.start()
+    supervisor = supervise_camera(hub, camera_args)
+
+    def wanted():
+        return time.time() - demand.value < 1.0
+
+    def publish_state():
+        while True:
+            camera_state.value = CAMERA_STATES.index(supervisor.state)
+            time.sleep(0.2)
+    threading.Thread(target=publish_state, daemon=True).start()
+
+    while hub.running:
+        if not wanted():
+            time.sleep(0.05)
+            continue
+        for frame in hub.frames(adaptive=False):
+            ring.write(frame)
+            new_frame.set()
+            if not wanted():
+                break
+
+
+class SharedFrameReader:
+    """Camera-like read() over a SharedFrameRing, so a passthrough FrameHub can serve one worker's JPEGs"""
+
+    def __init__(self, ring, new_frame, demand, process):
+        self.ring = ring
+        self.new_frame = new_frame
+        self.demand = demand
+        self.process = process
+        self.seq = int(ring.latest[0])
+
+    def read(self, image=None):
+        while True:
+            # Tell the worker someone is still watching, it pauses capture otherwise
+            self.demand.value = time.time()
+            seq, frame = self.ring.read(self.seq)
+            if frame is not None:
+                self.seq = seq
+                return True, frame
+            if not self.process.is_alive():
+                return False, None
+            self.new_frame.wait(0.5)
+            self.new_frame.clear()
+
+    def release(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(1.0)
+
+
+class CaptureProcess:
+    """Runs capture and encoding in a worker process that feeds a FrameHub through shared memory.
+
+    Fan-out, the quality ladder and multipart streaming stay in this process; only the worker
+    touches the camera and does the full-frame encodes, so they don't compete for this GIL.
+    The worker runs under a Supervisor like the in-process camera: when it dies the hub reports
+    the failed read, and a new worker is forked onto the same ring.
+    """
+
+    def __init__(self, camera_args, hub_args, slots=4):
+        # Fork so the worker gets the ring and events without pickling and without re-running the main script
+        self.ctx = multiprocessing.get_context('fork')
+        self.camera_args = camera_args
+        self.hub_args = hub_args
+        width, height = camera_args.get('width', 640), camera_args.get('height', 480)
+        self.ring = SharedFrameRing(slots=slots, slot_size=width * height * 3 // 2)
+        atexit.register(self.ring.close)
+        self.demand = self.ctx.Value('d', 0.0, lock=False)
+        self.camera_state = self.ctx.Value('i', 0, lock=False)
+        # The worker already dropped static frames, so don't run change detection twice
+        self.hub = FrameHub(passthrough=True, quality=hub_args.get('quality', 80))
+        self.supervisor = None
+        # The first worker is forked right away, while the caller has no other threads yet
+        self.first = self._spawn()
+
+    def _spawn(self):
+        # A fresh event per worker: one killed while holding the old event's lock would leave it locked
+        new_frame = self.ctx.Event()
+        process = self.ctx.Process(target=_capture_worker, daemon=True,
+                                   args=(self.ring, new_frame, self.demand, self.camera_state,
+                                         self.camera_args, self.hub_args))
+        process.start()
+        return SharedFrameReader(self.ring, new_frame, self.demand, process)
+
+    def _connect(self):
+        reader, self.first = self.first, None
+        if reader is None or not reader.process.is_alive():
+            reader = self._spawn()
+        return reader
+
+    def supervise(self):
+        """Hand the worker to a Supervisor that respawns it whenever the hub's reads fail"""
+        self.supervisor = Supervisor(
+            "Capture process",
+            self._connect,
+            on_connect=lambda reader: self.hub.set_camera(reader, passthrough=True),
+            on_disconnect=lambda reader: reader.release(),
+            max_errors=1,
+        )
+        self.hub.on_failure = self.supervisor.failed
+        self.supervisor.start()
+        return self
+
+    def status(self):
+        """Camera connection state as reported by the worker's supervisor, or why there's no worker"""
+        reader = self.supervisor.device if self.supervisor else None
+        if reader is None or not reader.process.is_alive():
+            error = self.supervisor.last_error if self.supervisor else None
+            return {'state': 'disconnected' if self.supervisor else 'connecting',
+                    'error': error or 'capture process not running'}
+        return {'state': CAMERA_STATES[self.camera_state.value]}
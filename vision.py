@@ -0,0 +1,271 @@
+"""Vision processor plugins run on the live camera frames, off the capture and streaming path.
+
+A plugin is a Processor subclass named as "module:Class" in VISION_PROCESSORS:
+
+    class Lanes(vision.Processor):
+        name = 'lanes'
+        rate_hz = 5
+
+        def process(self, image):          # BGR numpy image, returns JSON-able metadata
+            return {'offset': ...}
+
+        def draw(self, image, result):     # optional, draw result onto image for the overlay stream
+            cv2.line(image, ...)
+            return image
+
+    VISION_PROCESSORS=mylanes:Lanes python cam.py
+"""
+import importlib
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import metrics
+from video import FrameHub
+
+
+class Processor:
+    """Base class for vision plugins"""
+
+    name = None
+    rate_hz = 5.0  # most runs per second; fewer happen if a run takes longer than 1/rate_hz
+
+    def process(self, image):
+        """Analyse one BGR frame and return a JSON-serialisable dict"""
+        raise NotImplementedError
+
+    def draw(self, image, result):
+        """Draw result onto image for the overlay stream and return it, or None for no overlay"""
+        return None
+
+
+class Brightness(Processor):
+    """Mean and spread of the gray level, mostly useful to check the pipeline"""
+
+    name = 'brightness'
+    rate_hz = 2.0
+
+    def process(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return {'mean': float(gray.mean()), 'std': float(gray.std())}
+
+
+class Markers(Processor):
+    """ArUco marker ids and corners (4x4 dictionary)"""
+
+    name = 'markers'
+    rate_hz = 10.0
+
+    def __init__(self):
+        self.detector = cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50))
+
+    def process(self, image):
+        corners, ids, _ = self.detector.detectMarkers(image)
+        if ids is None:
+            return {'markers': []}
+        return {'markers': [{'id': int(marker_id), 'corners': corner.reshape(4, 2).round(1).tolist()}
+                            for marker_id, corner in zip(ids.ravel(), corners)]}
+
+    def draw(self, image, result):
+        for marker in result['markers']:
+            points = np.array(marker['corners'], dtype=np.int32)
+            cv2.polylines(image, [points], True, (0, 255, 0), 2)
+            cv2.putText(image, str(marker['id']), tuple(points[0]), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        return image
+
+
+def load_processors(specs):
+    """Instantiate processors from a comma-separated "module:Class" list"""
+    processors = []
+    for spec in filter(None, (spec.strip() for spec in specs.split(','))):
+        module, _, cls = spec.partition(':')
+        processor = getattr(importlib.import_module(module), cls)()
+        processor.name = processor.name or cls.lower()
+        processors.append(processor)
+    return processors
+
+
+# Process-pool workers are forked after this is set and look their processor up by name,
+# so the processor objects are never pickled
+_processors = {}
+
+
+def run_processor(name, frame, overlay, quality=70):
+    """Decode a JPEG frame, run one processor on it and optionally encode its overlay.
+
+    Returns (result, overlay JPEG bytes or None, seconds spent).
+    """
+    started = time.perf_counter()
+    processor = _processors[name]
+    image = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), cv2.IMREAD_COLOR)
+    result = processor.process(image)
+    drawn = None
+    if overlay:
+        image = processor.draw(image, result)
+        if image is not None:
+            ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            drawn = buffer.tobytes() if ok else None
+    return result, drawn, time.perf_counter() - started
+
+
+def _init_worker():
+    """Process-pool worker initializer. Shutdown is the parent's job, like for the capture worker"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+class ProcessorState:
+    """Scheduling, latest result and latency figures of one processor"""
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.name = processor.name
+        self.period = 1.0 / processor.rate_hz
+        self.next_due = 0.0
+        self.busy = False
+        self.state = 'running'
+        self.result = None
+        self.result_time = None
+        self.result_seq = None
+        self.runs = 0
+        self.skipped = 0  # frames it was due for but still busy with an earlier one
+        self.errors = 0
+        self.slow = 0  # consecutive runs over the latency limit
+        self.latency = 0.0  # running mean, seconds
+        self.latency_max = 0.0
+        self.turnaround = 0.0  # frame handed over to result back, including queueing and transfer
+        self.histogram = metrics.histogram('vision_process_seconds', 'Time one vision processor spent on a frame',
+                                           processor=self.name)
+        # Overlay frames for /vision/overlay, streamed like the camera; only for processors that draw
+        self.overlay = FrameHub(stream='overlay') if type(processor).draw is not Processor.draw else None
+
+    def status(self):
+        return {
+            'state': self.state,
+            'rate_hz': round(1.0 / self.period, 2),
+            'result': self.result,
+            'result_time': self.result_time,
+            'frame_seq': self.result_seq,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'latency_ms': round(self.latency * 1000, 2),
+            'latency_max_ms': round(self.latency_max * 1000, 2),
+            'turnaround_ms': round(self.turnaround * 1000, 2),
+            'overlay': self.overlay is not None,
+        }
+
+
+class VisionStage:
+    """Hands the newest camera frame to each processor at that processor's own rate.
+
+    Every processor has at most one frame in flight. A frame that arrives while it is still busy is
+    skipped for it, so a slow processor just runs less often and never queues work or holds up
+    capture. One that stays over max_latency for max_slow runs in a row is dropped.
+    """
+
+    def __init__(self, hub, processors, workers=2, use_processes=False, max_latency=1.0, max_slow=5):
+        self.hub = hub
+        self.states = {processor.name: ProcessorState(processor) for processor in processors}
+        self.max_latency = max_latency
+        self.max_slow = max_slow
+        _processors.update({processor.name: processor for processor in processors})
+        if use_processes:
+            # Fork like the capture worker, so the main script isn't re-run in the children
+            self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                            initializer=_init_worker)
+            # With fork every worker is started on the first submit. Do it now: the stage is created before
+            # capture and the other background threads start, so the children don't inherit them mid-flight.
+            self.pool.submit(int).result()
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vision')
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        for state in self.states.values():
+            if state.overlay is not None:
+                state.overlay.start()
+        # Processors want frames whether or not anyone is watching the stream
+        self.hub.subscribe(internal=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        seq = None
+        try:
+            while self.running:
+                new_seq, frame = self.hub.wait(seq, timeout=1.0)
+                if new_seq == seq:
+                    continue
+                seq = new_seq
+                if frame is None:
+                    continue
+                now = time.monotonic()
+                for state in self.states.values():
+                    if state.state != 'running' or now < state.next_due:
+                        continue
+                    with self.lock:
+                        if state.busy:
+                            state.skipped += 1
+                            continue
+                        state.busy = True
+                    state.next_due = now + state.period
+                    try:
+                        overlay = state.overlay is not None and state.overlay.viewers > 0
+                        future = self.pool.submit(run_processor, state.name, frame, overlay)
+                    except RuntimeError:
+                        return  # pool shut down, by stop() or at interpreter exit
+                    future.add_done_callback(lambda future, state=state, seq=seq, now=now:
+                                             self._done(state, seq, now, future))
+        finally:
+            self.hub.unsubscribe(internal=True)
+
+    def _done(self, state, seq, submitted, future):
+        with self.lock:
+            state.busy = False
+        try:
+            result, overlay, elapsed = future.result()
+        except Exception as e:
+            state.errors += 1
+            print(f"Vision processor {state.name} failed: {e}")
+            return
+
+        state.runs += 1
+        state.result = result
+        state.result_time = time.time()
+        state.result_seq = seq
+        state.latency += (elapsed - state.latency) * (1.0 if state.runs == 1 else 0.1)
+        state.latency_max = max(state.latency_max, elapsed)
+        state.turnaround = time.monotonic() - submitted
+        state.histogram.observe(elapsed)
+        if overlay is not None:
+            state.overlay.publish(overlay)
+
+        state.slow = state.slow + 1 if elapsed > self.max_latency else 0
+        if state.slow >= self.max_slow:
+            state.state = 'dropped'
+            print(f"Vision processor {state.name} dropped, {state.slow} runs over {self.max_latency:.2f}s")
+
+    def status(self):
+        return {name: state.status() for name, state in self.states.items()}
+
+    def overlays(self):
+        """{name: overlay FrameHub} of the processors that draw"""
+        return {name: state.overlay for name, state in self.states.items() if state.overlay is not None}
+
+    def overlay(self, name):
+        """The overlay FrameHub of a processor, or None if there's no such processor or it doesn't draw"""
+        state = self.states.get(name)
+        return state.overlay if state else None